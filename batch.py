@@ -0,0 +1,195 @@
+import io
+import os
+import json
+import time
+import queue
+import logging
+import traceback
+import multiprocessing
+
+# interval to check deadlines and dead workers
+POLL_INTERVAL = 0.05
+
+
+def read_manifest(path):
+    """
+    read_manifest parse manifest of batch jobs, one json object per line
+    e.g. {"q": 4, "testcase": "testdir/test.md/test.1", "options": {"mode": "count"}}
+    lines starting with # are comments, id of a job defaults to its line number
+    a job with binary output requires "out" file, results of jobs are text
+
+    path: path to manifest file
+    return: list of jobs
+    """
+
+    jobs = list()
+    with open(path) as manifest:
+        for number, line in enumerate(manifest.readlines(), start=1):
+            if len(line.strip()) == 0 or line[0] == '#':
+                continue
+
+            job = json.loads(line)
+            assert 'q' in job and 'testcase' in job, f'{path}:{number} job requires "q" and "testcase"'
+            job.setdefault('id', number)
+            job.setdefault('options', dict())
+            if job['options'].get('mode') == 'binary' and job['options'].get('out') is None:
+                raise ValueError(f'{path}:{number} binary output requires "out" file')
+            jobs.append(job)
+
+    return jobs
+
+
+def _worker(tasks, results, memory, cache=None, cache_size=None):
+    """
+    worker process solves jobs from tasks until it receives None, solvers
+    (numpy, scipy) are imported once when worker starts
+
+    tasks: queue of jobs for this worker
+    results: queue of (pid, job id, result), result is None when worker starts the job
+    memory: address space limit in MB or None
+    cache: directory of result cache or None
+    cache_size: size of result cache in MB
+    """
+
+    if memory is not None:
+        import resource
+        limit = memory * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    import main
+    main.preload()
+    if cache is not None:
+        from cache import ResultCache
+        cache = ResultCache(cache, cache_size * 1024 * 1024)
+
+    while True:
+        job = tasks.get()
+        if job is None:
+            break
+
+        # time limit of the job starts now, not while worker is importing solvers
+        results.put((os.getpid(), job['id'], None))
+        stdout, start = io.StringIO(), time.perf_counter()
+        result = {'status': 'ok', 'error': None}
+        try:
+            main.solve(job['q'], job['testcase'], cache=cache, file=stdout, **job['options'])
+        except MemoryError:
+            result = {'status': 'error', 'error': 'MemoryError: memory limit exceeded'}
+        except BaseException:
+            result = {'status': 'error', 'error': traceback.format_exc()}
+
+        result['time'] = time.perf_counter() - start
+        result['output'] = stdout.getvalue()
+        results.put((os.getpid(), job['id'], result))
+
+
+class _Worker:
+    """
+    _Worker is a warm worker process with its own task queue and the job it is running,
+    start is the time worker started the job, None until the worker picks it up
+    """
+
+    def __init__(self, context, results, memory, cache, cache_size):
+        self.tasks = context.Queue()
+        args = (self.tasks, results, memory, cache, cache_size)
+        self.process = context.Process(target=_worker, args=args, daemon=True)
+        self.process.start()
+        self.job, self.start = None, None
+
+    def submit(self, job):
+        self.job, self.start = job, None
+        self.tasks.put(job)
+
+    def stop(self):
+        self.tasks.put(None)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+
+
+def run(manifest, results_path, jobs=None, timeout=None, memory=None, cache=None, cache_size=256):
+    """
+    run solves all the jobs of manifest in a pool of warm worker processes, a worker running
+    a job longer than timeout or dying (crash, memory limit) is replaced by a new worker
+    one json result per job is appended to results_path as soon as it is available
+
+    manifest: path to manifest file (see read_manifest)
+    results_path: path to results file (jsonl)
+    jobs: number of worker processes, default number of cpus
+    timeout: time limit of a job in seconds, None for no limit
+    memory: memory limit of a worker in MB, None for no limit
+    cache: directory of result cache shared by the workers, None for no cache
+    cache_size: size of result cache in MB
+    return: list of results in order of completion
+    """
+
+    pending = read_manifest(manifest)
+    pending.reverse()
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(pending)))
+
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    workers = [_Worker(context, results, memory, cache, cache_size) for _ in range(jobs)]
+    by_pid = {worker.process.pid: worker for worker in workers}
+
+    completed = list()
+    with open(results_path, 'w') as results_file:
+        def record(job, result):
+            result = {'id': job['id'], 'q': job['q'], 'testcase': job['testcase'],
+                      'options': job['options'], **result}
+            results_file.write(json.dumps(result) + '\n')
+            results_file.flush()
+            completed.append(result)
+
+        def replace(worker, status, error):
+            """kill worker, record its job and start a new worker"""
+
+            worker.kill()
+            elapsed = time.perf_counter() - worker.start if worker.start is not None else 0.0
+            record(worker.job, {'status': status, 'error': error, 'time': elapsed, 'output': ''})
+            del by_pid[worker.process.pid]
+            workers.remove(worker)
+            if len(pending) > 0:
+                new = _Worker(context, results, memory, cache, cache_size)
+                by_pid[new.process.pid] = new
+                workers.append(new)
+
+        while len(pending) > 0 or any(worker.job is not None for worker in workers):
+            for worker in workers:
+                if worker.job is None and len(pending) > 0:
+                    worker.submit(pending.pop())
+
+            try:
+                pid, _, result = results.get(timeout=POLL_INTERVAL)
+                worker = by_pid.get(pid)
+                if worker is not None and worker.job is not None:
+                    if result is None:
+                        worker.start = time.perf_counter()
+                    else:
+                        record(worker.job, result)
+                        worker.job = None
+            except queue.Empty:
+                pass
+
+            now = time.perf_counter()
+            for worker in list(workers):
+                if worker.job is None:
+                    continue
+                if not worker.process.is_alive():
+                    logging.warning(f'worker {worker.process.pid} died on job {worker.job["id"]}')
+                    replace(worker, 'crashed', f'worker exited with code {worker.process.exitcode}')
+                elif timeout is not None and worker.start is not None and now - worker.start > timeout:
+                    logging.warning(f'job {worker.job["id"]} timed out after {timeout}s')
+                    replace(worker, 'timeout', f'time limit of {timeout}s exceeded')
+
+    for worker in workers:
+        worker.stop()
+    for worker in workers:
+        worker.process.join(timeout=1)
+        if worker.process.is_alive():
+            worker.kill()
+
+    return completed
+
+# vim: set path=./:
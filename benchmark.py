@@ -0,0 +1,284 @@
+import sys
+import json
+import time
+import argparse
+import itertools
+import tracemalloc
+import numpy as np
+
+import util
+import profiler
+from game import Game
+from two import TwoPlayer, TwoPlayerZeroSum
+from mechanism_design import Environment, IncrementalChecker
+
+# ------------------------------ generators ------------------------------
+# every generator is seeded and returns game as (n, s, u), like util.parse
+
+
+def _game(payoffs):
+    """game (n, s, u) from payoff tensor (#s1 x #s2 x ... x #sn x n)"""
+
+    sizes = payoffs.shape[:-1]
+    n = len(sizes)
+    s = [[f's{i+1}{k}' for k in range(size)] for i, size in enumerate(sizes)]
+
+    mapping = dict()
+    for index in itertools.product(*[range(size) for size in sizes]):
+        sv = [s[i][k] for i, k in enumerate(index)]
+        mapping[','.join(sv)] = [float(u) for u in payoffs[index]]
+
+    return n, s, util.make_utility(n, mapping)
+
+
+def random_game(seed, sizes):
+    """random game with integer payoffs in [-10, 10]"""
+
+    rng = np.random.default_rng(seed)
+    return _game(rng.integers(-10, 11, (*sizes, len(sizes))))
+
+
+def zero_sum_game(seed, sizes):
+    """random two player zero sum game"""
+
+    assert len(sizes) == 2, 'zero sum game has 2 players'
+    rng = np.random.default_rng(seed)
+    u1 = rng.integers(-10, 11, sizes)
+    return _game(np.stack([u1, -u1], axis=-1))
+
+
+def potential_game(seed, sizes):
+    """
+    random exact potential game, u_i(s) = Φ(s) + c_i(s-i)
+    every potential game has a pure strategy nash equilibrium
+    """
+
+    rng = np.random.default_rng(seed)
+    potential = rng.integers(-10, 11, sizes)
+
+    payoffs = list()
+    for i in range(len(sizes)):
+        shape = list(sizes)
+        shape[i] = 1
+        payoffs.append(potential + rng.integers(-5, 6, shape))
+
+    return _game(np.stack(payoffs, axis=-1))
+
+
+def degenerate_game(seed, sizes):
+    """random game with payoffs in {0, 1}, many ties and degenerate supports"""
+
+    rng = np.random.default_rng(seed)
+    return _game(rng.integers(0, 2, (*sizes, len(sizes))))
+
+
+def sparse_game(seed, sizes, density=0.05):
+    """random game with sparse utility store, density fraction of strategy vectors have random payoffs"""
+
+    rng = np.random.default_rng(seed)
+    n = len(sizes)
+    s = [[f's{i+1}{k}' for k in range(size)] for i, size in enumerate(sizes)]
+
+    total = int(np.prod(sizes))
+    mapping = dict()
+    for code in rng.choice(total, max(1, int(total * density)), replace=False):
+        index = np.unravel_index(code, sizes)
+        mapping[','.join(s[i][k] for i, k in enumerate(index))] = [float(u) for u in rng.integers(-10, 11, n)]
+
+    return n, s, util.SparseUtility(s, mapping, default=[0.0] * n)
+
+
+def md_environment(seed, sizes, num_outcomes):
+    """random mechanism design environment, type set of player i has sizes[i] types"""
+
+    rng = np.random.default_rng(seed)
+    n = len(sizes)
+    type_sets = [[f't{i+1}{k}' for k in range(size)] for i, size in enumerate(sizes)]
+    outcomes = [f'x{k}' for k in range(num_outcomes)]
+
+    mapping = dict()
+    for x in outcomes:
+        for theta in itertools.product(*type_sets):
+            mapping[','.join([x, *theta])] = [float(u) for u in rng.integers(0, 10, n)]
+
+    return Environment(n, type_sets, outcomes, lambda xtheta: mapping[xtheta.encode()])
+
+
+generators = {'random': random_game, 'zero_sum': zero_sum_game, 'potential': potential_game,
+              'degenerate': degenerate_game, 'sparse': sparse_game}
+
+# -------------------------------- solvers --------------------------------
+# every solver takes an instance and runs it, operations are counted by profiler
+
+
+def solve_psne(instance):
+    n, s, u = instance
+    Game(n, s, profiler.counted(u, 'utility_lookups')).psne()
+
+
+def solve_msne(instance):
+    n, s, u = instance
+    TwoPlayer(n, s, profiler.counted(u, 'utility_lookups')).msne()
+
+
+def solve_zero_sum_msne(instance):
+    n, s, u = instance
+    TwoPlayerZeroSum(n, s, profiler.counted(u, 'utility_lookups')).msne()
+
+
+def solve_regret(instance, batch=10000):
+    n, s, u = instance
+    rng = np.random.default_rng(0)
+    Game(n, s, profiler.counted(u, 'utility_lookups')).regret([rng.dirichlet(np.ones(len(Si)), batch) for Si in s])
+
+
+def solve_replicator(instance):
+    n, s, u = instance
+    TwoPlayer(n, s, profiler.counted(u, 'utility_lookups')).replicator(1000, 1000, equilibria=[])
+
+
+def solve_q4(env):
+    checker = IncrementalChecker(env)
+    for _ in profiler.iterate(checker.lexicographic(), 'functions'):
+        if checker.dsic() and checker.expost() and not checker.dictatorial():
+            profiler.count('valid')
+
+
+# suite: (name, solver, generator, list of sizes)
+suite = [
+    ('psne/random', solve_psne, 'random', [(4, 4), (8, 8), (16, 16), (32, 32), (4, 4, 4), (8, 8, 8)]),
+    ('psne/potential', solve_psne, 'potential', [(4, 4), (16, 16), (4, 4, 4), (8, 8, 8)]),
+    ('psne/degenerate', solve_psne, 'degenerate', [(4, 4), (16, 16), (8, 8, 8)]),
+    ('psne/sparse', solve_psne, 'sparse', [(16, 16), (64, 64), (16, 16, 16), (32, 32, 32)]),
+    ('msne/random', solve_msne, 'random', [(2, 2), (3, 3), (4, 4), (5, 5)]),
+    ('msne/degenerate', solve_msne, 'degenerate', [(2, 2), (3, 3), (4, 4)]),
+    ('regret/random', solve_regret, 'random', [(4, 4), (16, 16), (4, 4, 4)]),
+    ('replicator/random', solve_replicator, 'random', [(4, 4), (16, 16)]),
+    ('zero_sum_msne/zero_sum', solve_zero_sum_msne, 'zero_sum', [(4, 4), (16, 16), (64, 64)]),
+    ('q4/md', solve_q4, 'md', [((2, 2), 3), ((2, 2), 4), ((2, 3), 3), ((3, 3), 3)]),
+]
+
+quick_suite = [
+    ('psne/random', solve_psne, 'random', [(4, 4), (4, 4, 4)]),
+    ('psne/potential', solve_psne, 'potential', [(4, 4)]),
+    ('msne/random', solve_msne, 'random', [(2, 2), (3, 3)]),
+    ('zero_sum_msne/zero_sum', solve_zero_sum_msne, 'zero_sum', [(4, 4)]),
+    ('q4/md', solve_q4, 'md', [((2, 2), 3)]),
+]
+
+
+def _instance(generator, seed, size):
+    if generator == 'md':
+        sizes, num_outcomes = size
+        return md_environment(seed, sizes, num_outcomes)
+    return generators[generator](seed, size)
+
+
+def _size_name(size):
+    if isinstance(size[0], tuple):
+        sizes, num_outcomes = size
+        return 'x'.join(map(str, sizes)) + f'/{num_outcomes}'
+    return 'x'.join(map(str, size))
+
+
+def measure(solver, instance, repeat=3):
+    """
+    measure runs solver on instance, reports best wall time of repeat runs,
+    operation counts (profiler enabled) and peak traced memory of separate runs
+    """
+
+    times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        solver(instance)
+        times.append(time.perf_counter() - start)
+
+    profiler.enable()
+    try:
+        solver(instance)
+        operations = dict(profiler.counters)
+        if 'linprog' in profiler.timers:
+            operations['lp_calls'] = profiler.timers['linprog'][0]
+    finally:
+        profiler.disable()
+
+    tracemalloc.start()
+    solver(instance)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {'time': min(times), 'peak_memory': peak, 'operations': operations}
+
+
+def run(seed=0, repeat=3, quick=False, log=sys.stderr):
+    """
+    run all the benchmarks of suite across their size sweep
+
+    return: mapping of benchmark name (solver/generator/size) to measurement
+    """
+
+    results = dict()
+    for name, solver, generator, sizes in (quick_suite if quick else suite):
+        for size in sizes:
+            key = f'{name}/{_size_name(size)}'
+            results[key] = measure(solver, _instance(generator, seed, size), repeat)
+            if log is not None:
+                result = results[key]
+                print(f'{key:40s} {result["time"]*1000:10.3f} ms {result["peak_memory"]/1024:10.1f} KiB '
+                      f'{result["operations"]}', file=log)
+
+    return results
+
+
+def compare(baseline, current, threshold=0.25, min_time=0.001):
+    """
+    compare reports regressions of current results against baseline, a benchmark regresses if
+    its time grows by more than threshold (relative) and it takes at least min_time seconds
+
+    return: list of (benchmark name, baseline time, current time)
+    """
+
+    regressions = list()
+    for key, result in current.items():
+        if key not in baseline:
+            continue
+        before, after = baseline[key]['time'], result['time']
+        if after >= min_time and after > before * (1 + threshold):
+            regressions.append((key, before, after))
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark solvers on seeded random games')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run benchmarks and write results to a json file')
+    run_parser.add_argument('--out', type=str, default='benchmark.json', help='json file for results')
+    run_parser.add_argument('--seed', type=int, default=0, help='seed of the generators')
+    run_parser.add_argument('--repeat', type=int, default=3, help='runs of each benchmark, best time is reported')
+    run_parser.add_argument('--quick', action='store_true', help='run only small sizes')
+
+    compare_parser = commands.add_parser('compare', help='compare results against a baseline')
+    compare_parser.add_argument('baseline', type=str, help='baseline json file')
+    compare_parser.add_argument('current', type=str, help='current json file')
+    compare_parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative slowdown')
+
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        results = run(args.seed, args.repeat, args.quick)
+        with open(args.out, 'w') as outfile:
+            json.dump({'seed': args.seed, 'results': results}, outfile, indent=2)
+
+    if args.command == 'compare':
+        with open(args.baseline) as baseline, open(args.current) as current:
+            regressions = compare(json.load(baseline)['results'], json.load(current)['results'], args.threshold)
+
+        for key, before, after in regressions:
+            print(f'regression: {key} {before*1000:.3f} ms -> {after*1000:.3f} ms ({after/before:.2f}x)')
+        if len(regressions) > 0:
+            sys.exit(1)
+        print('no regressions')
+
+# vim: set path=./:
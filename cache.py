@@ -0,0 +1,127 @@
+import os
+import json
+import hashlib
+import logging
+
+# bump SOLVER_VERSION whenever a solver changes its results or output format,
+# all the cached results of older versions are ignored (and evicted eventually)
+SOLVER_VERSION = '2'
+
+DEFAULT_SIZE = 256 * 1024 * 1024
+
+
+def _normalized_lines(path, skip_header=False):
+    """non empty, non comment lines of a file without whitespace"""
+
+    with open(path, encoding='utf-8') as infile:
+        lines = infile.readlines()
+    if skip_header:
+        lines = lines[1:]
+
+    normalized = list()
+    for line in lines:
+        line = ''.join(line.split())
+        if len(line) != 0 and line[0] != '#':
+            normalized.append(line)
+    return normalized
+
+
+def game_digest(testcase):
+    """
+    game_digest hash of the normalized content of testcase folder, comments, whitespace,
+    csv headers and order of the utility (prior) rows do not change the digest
+
+    testcase: path to the testcase folder
+    return: hex digest
+    """
+
+    digest = hashlib.sha256()
+    digest.update('\n'.join(_normalized_lines(f'{testcase}/meta.txt')).encode())
+    for name in ('utility.csv', 'prior.csv'):
+        if os.path.exists(f'{testcase}/{name}'):
+            rows = sorted(_normalized_lines(f'{testcase}/{name}', skip_header=True))
+            digest.update(f'\n[{name}]\n'.encode() + '\n'.join(rows).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    ResultCache is an on-disk content addressed cache of solver results with
+    size bounded LRU eviction, one file per result in directory
+
+    Attributes:
+        directory: cache directory
+        max_bytes: total size of cached results, least recently used results are evicted
+
+    Methods:
+        key, get, put
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_SIZE):
+        self.directory, self.max_bytes = directory, max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(testcase, question, options=None):
+        """key of the result of question for testcase, solved with options"""
+
+        content = {'version': SOLVER_VERSION, 'question': question, 'options': options or dict(),
+                   'game': game_digest(testcase)}
+        return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, key):
+        """get cached result for key, None if not cached"""
+
+        try:
+            with open(self._path(key), encoding='utf-8') as infile:
+                result = json.load(infile)
+        except (OSError, ValueError):
+            return None
+
+        # modification time is the last use time for LRU eviction
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return result['result']
+
+    def put(self, key, result):
+        """put json serializable result for key and evict least recently used results"""
+
+        path, tmp = self._path(key), self._path(key) + f'.{os.getpid()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as outfile:
+            json.dump({'version': SOLVER_VERSION, 'result': result}, outfile)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """remove least recently used results until cache fits in max_bytes"""
+
+        entries = list()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.json'):
+                    continue
+                # results are shared by concurrent processes, another one may evict the entry first
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except FileNotFoundError:
+                total -= size
+            except OSError:
+                logging.warning(f'not able to evict cached result {path}')
+
+# vim: set path=./:
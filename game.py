@@ -5,6 +5,8 @@ import copy
 import itertools
 import numpy as np
 import logging
+import util
+import profiler
 
 # domination type
 strong_dominance = lambda x, y: np.all(x > y)
@@ -35,18 +37,26 @@ class Game:
 
         Si = self.s[i-1]  # strategy set of ith player
 
-        _ds, _ds_util, exist = Si[0], self._utility_tensor(Si[0], i), True
-        for k in range(1, len(Si)):
+        # if neither of two strategies dominates the other then none of them is dominant,
+        # the only candidate left dominates all the strategies after it
+        _ds, _ds_util, position = None, None, 0
+        for k in range(len(Si)):
             si_util = self._utility_tensor(Si[k], i)
-            if dominance(_ds_util, si_util):
-                continue
-            elif dominance(si_util, _ds_util):
+            if _ds is None or dominance(si_util, _ds_util):
                 # strategy Si[k] is dominating strategy
-                _ds, _ds_util, exist = Si[k], si_util, True
-            else:
-                _ds_util, exist = np.maximum(_ds_util, si_util), False
+                _ds, _ds_util, position = Si[k], si_util, k
+            elif not dominance(_ds_util, si_util):
+                _ds = None
+
+        if _ds is None:
+            return None
+
+        # candidate must dominate the strategies before it as well
+        for k in range(position):
+            if not dominance(_ds_util, self._utility_tensor(Si[k], i)):
+                return None
 
-        return _ds if exist else None
+        return _ds
 
     def _dominated_strategy(self, i, dominance):
         """
@@ -91,6 +101,7 @@ class Game:
 
         return _dse_profile
 
+    @profiler.profiled('Game.strongly_dominant_strategy')
     def strongly_dominant_strategy(self, i):
         """
         find strongly dominant strategy for ith player
@@ -104,6 +115,7 @@ class Game:
             logging.info('SDSE equilibria dose not exist')
         return sdse_profile
 
+    @profiler.profiled('Game.weakly_dominant_strategy')
     def weakly_dominant_strategy(self, i):
         """
         find weakly dominant strategy for ith player
@@ -117,11 +129,13 @@ class Game:
             logging.info('WDSE equilibria dose not exist')
         return wdse_profile
 
+    @profiler.profiled('Game.sdse')
     def sdse(self):
         """find strongly dominant strategy equilibrium if exist"""
 
         return self._dominant_strategy_equilibrium(self.strongly_dominant_strategy)
 
+    @profiler.profiled('Game.wdse')
     def wdse(self):
         """find weakly dominant strategy equilibrium if exist"""
 
@@ -142,7 +156,7 @@ class Game:
             max_utility = -math.inf
             _sv_set = set()
             for si in Si:
-                sv = _sv[:i-1] + tuple(si) + _sv[i-1:]
+                sv = _sv[:i-1] + (si,) + _sv[i-1:]
                 sith_utility = self.u(sv)[i-1]
                 if max_utility < sith_utility:
                     _sv_set.clear()
@@ -155,9 +169,13 @@ class Game:
 
         return sv_set
 
+    @profiler.profiled('Game.psne')
     def psne(self):
         """find Pure Strategy Nash Equilibrium if it exist"""
 
+        if self._store() is not None:
+            return self._sparse_psne()
+
         nash_eqilibrium = self._all_strategy_vectors()  # nash equilibrium strategy vectors set
         for i in range(1, self.n+1):
             ith_set = self._max_util_strategy_vector(i)
@@ -173,37 +191,117 @@ class Game:
 
 
 
+    @profiler.profiled('Game.maxmin')
     def maxmin(self, i):
         """find maxmin value and maxmin strategies of ith player"""
 
-        maxmin_strategy_set, maxmin_utility = set(), -math.inf
-        for si in self.s[i-1]:
-            utility_vector = self._utility_tensor(si, i)
-            min_utility = min(utility_vector)
-            if maxmin_utility < min_utility:
-                maxmin_utility = min_utility
-                maxmin_strategy_set.clear()
-                maxmin_strategy_set.add(si)
-            elif maxmin_utility == min_utility:
-                maxmin_strategy_set.add(si)
+        if self._store() is not None:
+            low = self._sparse_rows(i, np.minimum)
+        else:
+            low = self._payoff_rows(i).min(axis=1)
 
-        return maxmin_utility, maxmin_strategy_set
+        value = low.max()
+        return value, {self.s[i-1][a] for a in np.flatnonzero(low == value)}
 
+    @profiler.profiled('Game.minmax')
     def minmax(self, i):
         """find minmax value and minmax strategies ith player"""
 
-        minmax_strategy_set, minmax_utility = set(), math.inf
-        for si in self.s[i-1]:
-            utility_vector = self._utility_tensor(si, i)
-            max_utility = max(utility_vector)
-            if minmax_utility > max_utility:
-                minmax_utility = max_utility
-                minmax_strategy_set.clear()
-                minmax_strategy_set.add(si)
-            elif minmax_utility == max_utility:
-                minmax_strategy_set.add(si)
+        if self._store() is not None:
+            high = self._sparse_rows(i, np.maximum)
+        else:
+            high = self._payoff_rows(i).max(axis=1)
+
+        value = high.min()
+        return value, {self.s[i-1][a] for a in np.flatnonzero(high == value)}
+
+    @profiler.profiled('Game.mixed_security_levels')
+    def mixed_security_levels(self):
+        """
+        find mixed strategy maxmin and minmax of all the players, opponents of ith player are
+        treated as a coalition which can correlate their strategies, maxmin LP of ith player is
+            max v  s.t.  v <= Σ_a σ(a) u_i(a, s-i) ∀ s-i ∈ S-i,  Σ_a σ(a) = 1,  σ >= 0
+        minmax strategy τ of the coalition (a distribution over S-i) is the dual solution of the
+        maxmin LP, LPs of all the players are solved together as one block diagonal LP
+
+        return: list of ((maxmin value, σ_i), (minmax value, τ_-i)) for all the players, σ_i is
+                a distribution over s[i], τ_-i is a (#s1 x .. x #sn without #si) distribution over S-i
+                None if LP is not solved
+        """
 
-        return minmax_utility, minmax_strategy_set
+        from scipy.optimize import linprog
+        from scipy.sparse import block_diag
+
+        rows = [self._payoff_rows(i) for i in range(1, self.n+1)]
+
+        # variables of ith block (v, σ(a) ∀ a ∈ Si), objective -v
+        c, bounds, a_ub, a_eq = list(), list(), list(), list()
+        for Ui in rows:
+            ns, opponents = Ui.shape
+            c += [-1.0] + [0.0] * ns
+            bounds += [(None, None)] + [(0, 1)] * ns
+            a_ub.append(np.concatenate([np.ones((opponents, 1)), -Ui.T], axis=1))
+            a_eq.append(np.array([[0.0] + [1.0] * ns]))
+
+        a_ub, a_eq = block_diag(a_ub, format='csr'), block_diag(a_eq, format='csr')
+        result = profiler.call('linprog', linprog, c, A_ub=a_ub, b_ub=np.zeros(a_ub.shape[0]),
+                               A_eq=a_eq, b_eq=np.ones(self.n), bounds=bounds, method='highs')
+        if not result.success:
+            logging.warning(f'not able to find mixed security levels, {result.message}')
+            return None
+
+        levels, x, y = list(), 0, 0
+        duals = -result.ineqlin.marginals
+        for i, Ui in enumerate(rows):
+            ns, opponents = Ui.shape
+            sigma = np.clip(result.x[x+1:x+1+ns], 0, None)
+            tau = np.clip(duals[y:y+opponents], 0, None)
+            sigma, tau = sigma / sigma.sum(), tau / tau.sum()
+            x, y = x + ns + 1, y + opponents
+
+            shape = [len(Sj) for j, Sj in enumerate(self.s) if j != i]
+            levels.append(((float((sigma @ Ui).min()), sigma), (float((Ui @ tau).max()), tau.reshape(shape))))
+
+        return levels
+
+    @profiler.profiled('Game.regret')
+    def regret(self, profiles, epsilon=1e-6):
+        """
+        regret evaluates a batch of mixed strategy profiles, expected utility of every pure strategy
+        of ith player against the others is contracted from the utility tensor, e.g. for 3 players
+            D_1[b, a] = Σ_{s2, s3} σ_2[b, s2] σ_3[b, s3] u_1(a, s2, s3)
+        expected utility of ith player is Σ_a σ_i[b, a] D_i[b, a], best response utility is max_a D_i[b, a]
+
+        profiles: list of (batch x #si) arrays, one for every player, or (batch x n x max #si) array
+                  with zero padding for players with less strategies
+        epsilon: profile is an ε-nash equilibrium if regret of all the players is at most epsilon
+        return: dictionary of
+            expected, best_response, regret: (batch x n) arrays
+            max_regret: (batch) array of maximum regret over players
+            nash: (batch) array, whether profile is an ε-nash equilibrium
+        """
+
+        if isinstance(profiles, np.ndarray) and profiles.ndim == 3:
+            profiles = [profiles[:, i, :len(Si)] for i, Si in enumerate(self.s)]
+        profiles = [np.asarray(sigma, dtype=float).reshape(-1, len(Si)) for sigma, Si in zip(profiles, self.s)]
+        batch = profiles[0].shape[0]
+
+        U = self._payoff_tensor()
+        axes = [chr(ord('a') + i) for i in range(self.n)]
+        expected, best = np.empty((batch, self.n)), np.empty((batch, self.n))
+        for i in range(self.n):
+            # contract strategies of all the other players, D_i is (batch x #si)
+            others = [j for j in range(self.n) if j != i]
+            subscripts = ''.join(axes) + ''.join(f',z{axes[j]}' for j in others) + f'->z{axes[i]}'
+            D = np.einsum(subscripts, U[..., i], *[profiles[j] for j in others], optimize=True)
+
+            expected[:, i] = np.einsum('za,za->z', profiles[i], D)
+            best[:, i] = D.max(axis=1)
+
+        regret = best - expected
+        max_regret = regret.max(axis=1)
+        return {'expected': expected, 'best_response': best, 'regret': regret,
+                'max_regret': max_regret, 'nash': max_regret <= epsilon}
 
     def _iterative_elimination(self, domination_type=strong_dominance):
         """
@@ -241,6 +339,13 @@ class Game:
 
         comb = [[si] if j == i else self.s[j-1] for j in range(1, self.n+1)]
 
+        store = self._store()
+        if store is not None:
+            # batch lookup of (si, s-i) ∀ s-i ∈ S-i, in the same order as itertools.product
+            indices = [[store.index[j][sj] for sj in Sj] for j, Sj in enumerate(comb)]
+            grid = np.stack(np.meshgrid(*indices, indexing='ij'), axis=-1).reshape(-1, self.n)
+            return store.lookup(grid)[:, i-1]
+
         utility_si = list()
         # (si, s-i) ∀ s-i ∈ S-i
         for sv in itertools.product(*comb):
@@ -248,4 +353,305 @@ class Game:
 
         return np.array(utility_si)
 
+    def _payoff_tensor(self):
+        """utility tensor (#s1 x #s2 x ... x #sn x n) of the game, looked up once"""
+
+        if getattr(self, '_tensor', None) is None:
+            store = self._store()
+            if store is not None:
+                indices = [np.array([store.index[i][si] for si in Si], dtype=np.int64) for i, Si in enumerate(self.s)]
+                self._tensor = store.lookup(np.stack(np.meshgrid(*indices, indexing='ij'), axis=-1))
+            else:
+                self._tensor = np.empty((*[len(Si) for Si in self.s], self.n))
+                for sv in itertools.product(*[range(len(Si)) for Si in self.s]):
+                    self._tensor[sv] = self.u(tuple(self.s[i][k] for i, k in enumerate(sv)))
+
+        return self._tensor
+
+    def _payoff_rows(self, i):
+        """utilities of ith player as (#si x #S-i) matrix, row of si is u_i(si, s-i) ∀ s-i ∈ S-i"""
+
+        U = self._payoff_tensor()
+        return np.moveaxis(U[..., i-1], i-1, 0).reshape(len(self.s[i-1]), -1)
+
+    def _store(self):
+        """sparse utility store of the game, None if utility is not stored sparsely or is not defined everywhere"""
+
+        store = util.sparse_store(self.u)
+        if store is None or (store.default is None and store.missing > 0):
+            return None
+        return store
+
+    def _sparse_subgame(self):
+        """stored strategy vectors of the game, (positions, utilities), and number of strategies of every player"""
+
+        store = self._store()
+        indices = [np.array([store.index[i][si] for si in Si], dtype=np.int64) for i, Si in enumerate(self.s)]
+        positions, values = store.restrict(indices)
+        sizes = tuple(len(Si) for Si in self.s)
+
+        default = store.default if store.default is not None else [-math.inf] * self.n
+        return positions, values, sizes, default
+
+    def _sparse_lines(self, i, positions, values, sizes, default):
+        """
+        maximum utility of ith player (0 indexed) on the lines (si, s-i) ∀ si ∈ Si which have a stored
+        strategy vector, only stored strategy vectors are visited, a line with a missing strategy
+        vector starts from default, all the other lines have only default utility
+
+        return: lines (positions of s-i of every line with a stored strategy vector), their maxima
+                and line index of every stored strategy vector
+        """
+
+        lines, inverse = np.unique(np.delete(positions, i, axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+        count = np.bincount(inverse, minlength=len(lines))
+        line_max = np.where(count < sizes[i], default[i], -math.inf)
+        np.maximum.at(line_max, inverse, values[:, i])
+        return lines, line_max, inverse
+
+    def _sparse_psne(self):
+        """
+        psne of a game with sparse utility store, stored strategy vectors are checked against the
+        maxima of their lines, a missing strategy vector is a best response of ith player iff default
+        utility is the maximum of its line, so it is a psne iff none of its lines has a stored utility
+        above default; missing psne are enumerated line by line of the last player as the positions
+        which are neither on a bad line of another player nor stored, no array of size
+        #s1 * #s2 * ... * #sn is allocated and no strategy vector is visited one by one
+        """
+
+        positions, values, sizes, default = self._sparse_subgame()
+        n, last = self.n, self.n - 1
+
+        # bad lines of ith player have a stored utility above default, bad_last[i][s-i without last
+        # player] = positions of last player of bad lines, bad_prefixes = bad lines of last player
+        stored = np.ones(len(positions), dtype=bool)
+        bad_last, bad_prefixes = [dict() for _ in range(last)], set()
+        for i in range(n):
+            lines, line_max, inverse = self._sparse_lines(i, positions, values, sizes, default)
+            stored &= values[:, i] == line_max[inverse]
+
+            for line in lines[line_max > default[i]].tolist():
+                if i == last:
+                    bad_prefixes.add(tuple(line))
+                else:
+                    bad_last[i].setdefault(tuple(line[:-1]), set()).add(line[-1])
+
+        equilibria = {tuple(sv) for sv in positions[stored].tolist()}
+
+        if len(positions) < math.prod(sizes):
+            # stored_last[s-last] = positions of last player of stored strategy vectors on the line
+            stored_last = dict()
+            for sv in positions.tolist():
+                stored_last.setdefault(tuple(sv[:-1]), list()).append(sv[-1])
+            bad_last = [{key: np.array(sorted(ks)) for key, ks in bad.items()} for bad in bad_last]
+
+            # allowed[bad lines] = positions of last player not on any of the bad lines, shared by
+            # all the prefixes with the same bad lines
+            everything, allowed = np.arange(sizes[-1]), dict()
+            for prefix in itertools.product(*[range(size) for size in sizes[:-1]]):
+                if prefix in bad_prefixes:
+                    continue
+
+                # prune the prefix if a bad line of another player covers all the positions of last player
+                keys = list()
+                for i in range(last):
+                    key = prefix[:i] + prefix[i+1:]
+                    if key in bad_last[i]:
+                        keys.append((i, key))
+                keys = tuple(keys)
+                if any(len(bad_last[i][key]) == sizes[-1] for i, key in keys):
+                    continue
+
+                if keys not in allowed:
+                    excluded = [bad_last[i][key] for i, key in keys]
+                    allowed[keys] = np.setdiff1d(everything, np.concatenate(excluded)) if excluded else everything
+                ks = allowed[keys]
+                if prefix in stored_last:
+                    ks = np.setdiff1d(ks, stored_last[prefix], assume_unique=True)
+                equilibria.update(prefix + (k,) for k in ks.tolist())
+
+        nash_eqilibrium = {tuple(self.s[i][k] for i, k in enumerate(sv)) for sv in equilibria}
+        if len(nash_eqilibrium) == 0:
+            logging.info('Pure Strategy Nash Equilibrium does not exist')
+            return None
+
+        return nash_eqilibrium
+
+    def _sparse_rows(self, i, reduce):
+        """
+        reduce (np.minimum or np.maximum) utilities of ith player for every strategy of ith player,
+        only stored strategy vectors are visited, a row with a missing strategy vector starts from default
+        """
+
+        positions, values, sizes, default = self._sparse_subgame()
+        rows = positions[:, i-1]
+        opponents = math.prod(sizes) // sizes[i-1]  # #S-i
+
+        count = np.bincount(rows, minlength=sizes[i-1])
+        result = np.where(count < opponents, default[i-1], math.inf if reduce is np.minimum else -math.inf)
+        reduce.at(result, rows, values[:, i-1])
+        return result
+
+class MutableGame(Game):
+    """
+    MutableGame is a game with a mutable utility tensor for what-if edits, update_payoff changes
+    utilities of one strategy vector and maintains best responses, psne, dominance relations and
+    maxmin/minmax values incrementally, only the slices of that strategy vector are evaluated again
+
+    dominance is pairwise, si is dominant if it dominates every other strategy of the player
+
+    Attributes:
+        U: utility tensor (#s1 x #s2 x ... x #sn x n), U[k1, ..., kn] = u(s1[k1], ..., sn[kn])
+        index: index[i][si] = position of strategy si in s[i]
+        best: best[k1, ..., kn, i] reports whether s(i+1)[ki] is a best response of (i+1)th player
+        nash: nash[k1, ..., kn] reports whether strategy vector is a psne
+        equilibria: set of psne as tuples of strategy indices
+        greater: greater[i][a, b] = #{s-i : u_i(a, s-i) > u_i(b, s-i)}
+        low, high: low[i][a] (high[i][a]) = min (max) utility of (i+1)th player with strategy a
+    """
+
+    def __init__(self, n, s, u):
+        self.n, self.s = n, s
+        self.index = [{si: k for k, si in enumerate(Si)} for Si in s]
+
+        self.U = Game(n, s, u)._payoff_tensor()
+        self.u = self._utility
+        self._recount()
+
+    def _utility(self, sv):
+        """utility function of the current utility tensor, u(~s)"""
+
+        return list(self.U[self._indices(sv)])
+
+    def _payoff_tensor(self):
+        return self.U
+
+    def _indices(self, sv):
+        return tuple(self.index[i][si] for i, si in enumerate(sv))
+
+    def _recount(self):
+        """compute best responses, psne, dominance counts and min/max utilities from scratch"""
+
+        U = self.U
+        self.best = np.stack([U[..., i] == U[..., i].max(axis=i, keepdims=True) for i in range(self.n)], axis=-1)
+        self.nash = self.best.all(axis=-1)
+        self.equilibria = {tuple(int(k) for k in sv) for sv in np.argwhere(self.nash)}
+
+        self.greater, self.low, self.high = list(), list(), list()
+        for i in range(self.n):
+            # rows are strategies of ith player, columns are s-i
+            Ui = np.moveaxis(U[..., i], i, 0).reshape(len(self.s[i]), -1)
+            self.greater.append(np.array([(row > Ui).sum(axis=1) for row in Ui]))
+            self.low.append(Ui.min(axis=1))
+            self.high.append(Ui.max(axis=1))
+
+    def _line(self, sv, i):
+        """index of all the strategy vectors (si, s-i) ∀ si ∈ Si, with s-i fixed by sv"""
+
+        return sv[:i] + (slice(None),) + sv[i+1:]
+
+    def _row(self, a, i):
+        """index of all the strategy vectors (a, s-i) ∀ s-i ∈ S-i"""
+
+        return (slice(None),) * i + (a,) + (slice(None),) * (self.n-i-1)
+
+    @profiler.profiled('MutableGame.update_payoff')
+    def update_payoff(self, profile, utilities):
+        """
+        update_payoff sets u(profile) = utilities, O(#s1 + #s2 + ... + #sn) except when the only
+        minimum (maximum) utility of a strategy grows (shrinks), then its row of #S-i is scanned
+
+        profile: strategy vector (s1, s2, ..., sn)
+        utilities: utilities of all the players for profile
+        """
+
+        sv = self._indices(profile)
+        old, new = self.U[sv].copy(), np.asarray(utilities, dtype=float)
+        self.U[sv] = new
+
+        changed = [i for i in range(self.n) if old[i] != new[i]]
+        for i in changed:
+            a, before, after = sv[i], old[i], new[i]
+            line = self._line(sv, i)
+            column = self.U[line + (i,)]  # u_i(si, s-i) ∀ si ∈ Si
+
+            # dominance counts of a against all the other strategies at s-i
+            greater = self.greater[i]
+            greater[a, :] += (after > column).astype(int) - (before > column)
+            greater[:, a] += (column > after).astype(int) - (column > before)
+            greater[a, a] = 0
+
+            low, high = self.low[i], self.high[i]
+            if after < low[a]:
+                low[a] = after
+            elif before == low[a] and after > before:
+                low[a] = self.U[self._row(a, i) + (i,)].min()
+            if after > high[a]:
+                high[a] = after
+            elif before == high[a] and after < before:
+                high[a] = self.U[self._row(a, i) + (i,)].max()
+
+            self.best[line + (i,)] = column == column.max()
+
+        # psne can change only on the lines of the changed best responses
+        for i in changed:
+            line = self._line(sv, i)
+            nash = self.best[line].all(axis=-1)
+            for k in np.flatnonzero(nash != self.nash[line]):
+                equilibrium = sv[:i] + (int(k),) + sv[i+1:]
+                if nash[k]:
+                    self.equilibria.add(equilibrium)
+                else:
+                    self.equilibria.discard(equilibrium)
+            self.nash[line] = nash
+
+    def _dominant(self, i, weak):
+        """dominant strategy of ith player from dominance counts"""
+
+        greater, Si = self.greater[i-1], self.s[i-1]
+        if weak:
+            dominates = (greater.T == 0) & (greater > 0)
+        else:
+            dominates = greater == self.U[..., 0].size // len(Si)  # #S-i
+        np.fill_diagonal(dominates, True)
+
+        dominant = np.flatnonzero(dominates.all(axis=1))
+        return Si[dominant[0]] if len(dominant) > 0 else None
+
+    @profiler.profiled('MutableGame.strongly_dominant_strategy')
+    def strongly_dominant_strategy(self, i):
+        sds = self._dominant(i, weak=False)
+        if sds is None:
+            logging.info('SDSE equilibria dose not exist')
+        return sds
+
+    @profiler.profiled('MutableGame.weakly_dominant_strategy')
+    def weakly_dominant_strategy(self, i):
+        wds = self._dominant(i, weak=True)
+        if wds is None:
+            logging.info('WDSE equilibria dose not exist')
+        return wds
+
+    @profiler.profiled('MutableGame.psne')
+    def psne(self):
+        if len(self.equilibria) == 0:
+            logging.info('Pure Strategy Nash Equilibrium does not exist')
+            return None
+
+        return {tuple(self.s[i][k] for i, k in enumerate(sv)) for sv in self.equilibria}
+
+    @profiler.profiled('MutableGame.maxmin')
+    def maxmin(self, i):
+        low = self.low[i-1]
+        value = low.max()
+        return value, {self.s[i-1][a] for a in np.flatnonzero(low == value)}
+
+    @profiler.profiled('MutableGame.minmax')
+    def minmax(self, i):
+        high = self.high[i-1]
+        value = high.min()
+        return value, {self.s[i-1][a] for a in np.flatnonzero(high == value)}
+
 # vim: set path=./:
@@ -1,67 +1,102 @@
+import io
+import os
+import sys
 import argparse
+import functools
+import importlib
 import util
+import profiler
 
-from game import Game
-from two import TwoPlayer, TwoPlayerZeroSum
-from social_function import SocialChoiceFunc, EncodedList
-from mechanism_design import Environment
+# solver stack of every question (module, model class), a module is imported only when
+# its question is solved, e.g. scipy (two.py) is not imported to solve q1
+models = {1: ('game', 'Game'), 2: ('two', 'TwoPlayer'), 3: ('two', 'TwoPlayerZeroSum'),
+          4: ('mechanism_design', 'Environment')}
 
-def q1(testcase):
-    n, s, u = util.parse(testcase)
-    game = Game(n, s, u)
+def model_class(question):
+    """model_class imports solver stack of question and returns its model class"""
 
-    print('\n---------------- strong dominant strategies ----------------')
+    module, name = models[question]
+    return getattr(importlib.import_module(module), name)
+
+def preload():
+    """preload imports solver stacks of all the questions, for long running processes"""
+
+    for question in models:
+        model_class(question)
+
+def load(question, testcase):
+    """
+    load parses testcase and builds the model for question, Game (1), TwoPlayer (2),
+    TwoPlayerZeroSum (3) or Environment (4)
+    """
+
+    model = model_class(question)
+    if question == 4:
+        with profiler.phase('parse'):
+            n, type_sets, outcomes, u = util.parse_md(testcase)
+            prior = util.parse_prior(testcase, type_sets)
+        with profiler.phase('model'):
+            return model(n, type_sets, outcomes, u, prior)
+
+    with profiler.phase('parse'):
+        n, s, u = util.parse(testcase)
+    with profiler.phase('model'):
+        return model(n, s, u)
+
+def q1(testcase, model=None, file=None):
+    game = load(1, testcase) if model is None else model
+    n = game.n
+
+    print('\n---------------- strong dominant strategies ----------------', file=file)
     for i in range(1, n+1):
         sds_i = game.strongly_dominant_strategy(i)
-        print(f'player {i}: sds = {sds_i}')
+        print(f'player {i}: sds = {sds_i}', file=file)
 
-    print('\n----------------- weak dominant strategies -----------------')
+    print('\n----------------- weak dominant strategies -----------------', file=file)
     for i in range(1, n+1):
         wds_i = game.weakly_dominant_strategy(i)
-        print(f'player {i}: wds = {wds_i}')
+        print(f'player {i}: wds = {wds_i}', file=file)
 
 
-    print('\n----------- strong dominant strategy equilibrium -----------')
-    print(f'sdse: {game.sdse()}')
+    print('\n----------- strong dominant strategy equilibrium -----------', file=file)
+    print(f'sdse: {game.sdse()}', file=file)
 
 
-    print('\n------------ weak dominant strategy equilibrium ------------')
-    print(f'wdse: {game.wdse()}')
+    print('\n------------ weak dominant strategy equilibrium ------------', file=file)
+    print(f'wdse: {game.wdse()}', file=file)
 
 
-    print('\n-------------- pure strategy nash equilibrium --------------')
+    print('\n-------------- pure strategy nash equilibrium --------------', file=file)
     psne = game.psne()
     if psne is None:
         psne = 'does not exist'
-    print(f'psne: {psne}')
+    print(f'psne: {psne}', file=file)
 
 
-    print('\n-------------------------- maxmin --------------------------')
+    print('\n-------------------------- maxmin --------------------------', file=file)
     for i in range(1, n+1):
         value, strategy_set = game.maxmin(i)
-        print(f'player {i}: value = {value}, strategies = {strategy_set}')
+        print(f'player {i}: value = {value}, strategies = {strategy_set}', file=file)
 
 
-    print('\n-------------------------- minmax --------------------------')
+    print('\n-------------------------- minmax --------------------------', file=file)
     for i in range(1, n+1):
         value, strategy_set = game.minmax(i)
-        print(f'player {i}: value = {value}, strategies = {strategy_set}')
+        print(f'player {i}: value = {value}, strategies = {strategy_set}', file=file)
 
 
     
-def q2(testcase):
-    n, s, u = util.parse(testcase)
-    game = TwoPlayer(n, s, u)
+def q2(testcase, model=None, file=None):
+    game = load(2, testcase) if model is None else model
     msne = game.msne()
 
     if msne is None:
         msne = 'not able to find'
 
-    print(f'\nmsne: (P1, P2) = {msne}\n')
+    print(f'\nmsne: (P1, P2) = {msne}\n', file=file)
     
-def q3(testcase):
-    n, s, u = util.parse(testcase)
-    game = TwoPlayerZeroSum(n, s, u)
+def q3(testcase, model=None, file=None):
+    game = load(3, testcase) if model is None else model
     saddle_point = game.saddle_point()
     msne = game.msne()
 
@@ -71,20 +106,130 @@ def q3(testcase):
     if msne is None:
         msne = 'not able to find'
 
-    print(f'\nsaddle point: {saddle_point}')
-    print(f'msne: (P1, P2) =  {msne}\n')
+    print(f'\nsaddle point: {saddle_point}', file=file)
+    print(f'msne: (P1, P2) =  {msne}\n', file=file)
+
+def q4(testcase, model=None, file=None, symmetry=False, representatives=False, mode='text', out=None):
+    """
+    q4 checks all social choice functions, mode selects the output
+        text: print valid functions
+        jsonl, binary: stream valid functions as records (see output.py)
+        count: only count valid functions
+        tally: count dsic, expost, non-dictatorial and valid functions
+    model: Environment of testcase, loaded if not given
+    file: stream for the output, stdout if not given (out overrides it for text/jsonl/binary modes)
+    """
+
+    import output
+    from mechanism_design import IncrementalChecker
 
-def q4(testcase):
-    n, type_sets, outcomes, u = util.parse_md(testcase)
-    env = Environment(n, type_sets, outcomes, u)
+    env = load(4, testcase) if model is None else model
+    with profiler.phase('model'):
+        checker = IncrementalChecker(env)
 
-    # for all possible social choice functions check dsic, export and non-dictatorial
-    for func in SocialChoiceFunc.all(type_sets, outcomes):
-        dsic, expost, non_dictatorial = env.dsic(func), env.expost(func), (not env.dictatorial(func))
+        # walk one canonical function per orbit of symmetric functions, all the functions
+        # in an orbit have the same dsic, expost and dictatorial verdicts
+        # otherwise functions are walked in id order, only the Ѳ changed by a carry are reassigned
+        group = env.symmetries() if symmetry or representatives else None
+
+    walk = checker.lexicographic() if group is None else group.representatives(checker)
+    walk = profiler.iterate(walk, 'scf_evaluated')
+    weight = (lambda f: 1) if group is None else (lambda f: len(group.orbit(f)))
+
+    if mode in ('count', 'tally'):
+        with profiler.phase('q4.check'):
+            tally = _q4_tally(walk, checker, weight, mode)
+
+        if mode == 'count':
+            print(f'\nvalid functions: {tally["valid"]}\n', file=file)
+        else:
+            print(file=file)
+            for key, value in tally.items():
+                print(f'{key}: {value}', file=file)
+        return
+
+    if out is None and file is not None:
+        stream = file
+    else:
+        stream = output.open_stream(out, binary=(mode == 'binary'))
+    writer = output.writers[mode](env, stream, orbit_sizes=(group is not None and representatives))
+    try:
+        with profiler.phase('q4.check'):
+            for f in walk:
+                valid = checker.dsic() and checker.expost() and (not checker.dictatorial())
+                if not valid:
+                    continue
+
+                if group is None:
+                    writer.write(f)
+                elif representatives:
+                    writer.write(f, len(group.orbit(f)))
+                else:
+                    for image in group.orbit(f):
+                        writer.write(image)
+    finally:
+        writer.close()
+        if out is not None:
+            stream.close()
+
+def _q4_tally(walk, checker, weight, mode):
+    """count valid functions (mode count) or all the properties (mode tally) weighted by orbit sizes"""
+
+    tally = {'functions': 0, 'dsic': 0, 'expost': 0, 'non_dictatorial': 0, 'valid': 0}
+    for f in walk:
+        dsic, expost, non_dictatorial = checker.dsic(), checker.expost(), (not checker.dictatorial())
         valid = dsic and expost and non_dictatorial
-        if valid:
-            print(func)
-    
+        if mode == 'count':
+            tally['valid'] += weight(f) if valid else 0
+            continue
+
+        k = weight(f)
+        tally['functions'] += k
+        tally['dsic'] += k if dsic else 0
+        tally['expost'] += k if expost else 0
+        tally['non_dictatorial'] += k if non_dictatorial else 0
+        tally['valid'] += k if valid else 0
+
+    return tally
+
+# q4 options which change the output and their defaults
+q4_defaults = {'symmetry': False, 'representatives': False, 'mode': 'text'}
+
+def solve(question, testcase, cache=None, model=None, file=None, **options):
+    """
+    solve question for testcase, options are passed to q4
+
+    question: question number 1, 2, 3 or 4
+    testcase: path to the testcase folder
+    cache: ResultCache, output of a game solved before is printed without solving it again
+    model: model of testcase (see load), loaded if not given
+    file: stream for the output, stdout if not given
+    """
+
+    solver = {1: q1, 2: q2, 3: q3, 4: functools.partial(q4, **options)}
+    if question not in solver:
+        print(f'\nInvalid question number: {question}\n', file=file)
+        return
+
+    # results written to a file (or binary stdout) are not cached
+    if cache is None or options.get('out') is not None or options.get('mode') == 'binary':
+        solver[question](testcase, model, file)
+        return
+
+    # q4 options are keyed with their defaults, out does not change the output
+    key_options = None
+    if question == 4:
+        key_options = {name: options.get(name, default) for name, default in q4_defaults.items()}
+    key = cache.key(testcase, question, key_options)
+    result = cache.get(key)
+    if result is None:
+        buffer = io.StringIO()
+        solver[question](testcase, model, buffer)
+        result = buffer.getvalue()
+        cache.put(key, result)
+
+    print(result, end='', file=file)
+
 if __name__ == '__main__':
     description = """
         game theory assignment solve questions for corresponding testcases
@@ -98,20 +243,74 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument('--q', type=int, nargs='+', help='question to solve e.g. --q 1 2 3 4')
     parser.add_argument('--testcase', type=str, nargs='+', help='directories for the testcases')
+    parser.add_argument('--symmetry', action='store_true', help='q4: enumerate one function per symmetry orbit')
+    parser.add_argument('--representatives', action='store_true',
+                        help='q4: print only orbit representatives with orbit sizes (implies --symmetry)')
+    parser.add_argument('--output', type=str, default='text', choices=['text', 'jsonl', 'binary', 'count', 'tally'],
+                        help='q4: output mode for valid functions')
+    parser.add_argument('--out', type=str, default=None, help='q4: file for text/jsonl/binary output (default stdout)')
+
+    parser.add_argument('--profile', type=str, nargs='?', const='-', default=None,
+                        help='write json profile (phase timers, counters) to file, stderr if no file is given')
+    parser.add_argument('--cache', type=str, default=None, help='directory of persistent result cache')
+    parser.add_argument('--cache-size', type=int, default=256, help='size of result cache in MB')
+    parser.add_argument('--socket', type=str, default=None, help='solve with resident solver service (service.py)')
+    parser.add_argument('--batch', type=str, default=None, help='manifest (jsonl) of jobs to solve in parallel')
+    parser.add_argument('--results', type=str, default='results.jsonl', help='batch: file for json result of every job')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='batch: number of worker processes')
+    parser.add_argument('--timeout', type=float, default=None, help='batch: time limit of a job in seconds')
+    parser.add_argument('--memory', type=int, default=None, help='batch: memory limit of a worker in MB')
 
     args = parser.parse_args()
 
+    if args.batch is not None:
+        import batch
+        results = batch.run(args.batch, args.results, jobs=args.jobs, timeout=args.timeout, memory=args.memory,
+                            cache=args.cache, cache_size=args.cache_size)
+        summary = dict()
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+        print(f'jobs: {len(results)}, ' + ', '.join(f'{status}: {count}' for status, count in sorted(summary.items())))
+
+        # exit with 1 if any job failed (error, timeout, crashed)
+        raise SystemExit(0 if all(result['status'] == 'ok' for result in results) else 1)
+
 	# check if all questions has corresponding testcase, e.g. len(args.q) == len(args.testcase)
     assert len(args.q) == len(args.testcase), 'number of testcases should be same as number of questions'
 
-    solver = {1: q1, 2: q2, 3: q3, 4: q4}
+    if args.profile is not None:
+        profiler.enable()
+
+    q4_options = {'symmetry': args.symmetry, 'representatives': args.representatives,
+                  'mode': args.output, 'out': args.out}
+    cache = None
+    if args.cache is not None:
+        from cache import ResultCache
+        cache = ResultCache(args.cache, args.cache_size * 1024 * 1024)
     for i in range(len(args.q)):
         question, testcase = args.q[i], args.testcase[i]
-        solve = solver.get(question, lambda _: print(f'\nInvalid question number: {question}\n'))
 
-    	# solve question for testcase
-        print(f'\n\033[1m\033[1;32m=================== solving question {question} =====================')
-        print(f'\033[1;31mtestcase: {testcase}\033[0m')
-        solve(testcase)
+    	# solve question for testcase, banner goes to stderr if q4 streams records to stdout
+        banner = sys.stdout
+        if question == 4 and args.output in ('jsonl', 'binary') and args.out is None:
+            banner = sys.stderr
+        print(f'\n\033[1m\033[1;32m=================== solving question {question} =====================', file=banner)
+        print(f'\033[1;31mtestcase: {testcase}\033[0m', file=banner)
+        if args.socket is None:
+            solve(question, testcase, cache=cache, **q4_options)
+            continue
+
+        # solve with resident solver service
+        import service
+        response = service.request(args.socket, question, testcase, q4_options)
+        if response['status'] != 'ok':
+            print(f'\nservice error: {response["error"]}', file=sys.stderr)
+            continue
+        print(response['output'], end='')
+
+    if args.profile == '-':
+        print(profiler.dump(), file=sys.stderr)
+    elif args.profile is not None:
+        profiler.dump(args.profile)
 
 # vim: set path=./:
@@ -3,7 +3,10 @@ import copy
 import logging
 import util
 import numpy as np
-from social_function import EncodedList
+from social_function import EncodedList, SocialChoiceFunc, Mechanism
+
+# tolerance for comparison of expected utilities
+tolerance = 1e-9
 
 class Environment:
     """
@@ -15,19 +18,25 @@ class Environment:
         types: represents the real types of the players
         outcomes: represents the outcome set of the environment
         utility_func: u(x, theta) -> is ordered list of all the utilities of the players
+        prior: prior over types (#t1 x #t2 x ... x #tn array), optional, used by bic
 
     Methods:
-        dsic, export, dictatorial
+        dsic, export, dictatorial, vcg, interim_utilities, bic
     """
 
-    def __init__(self, n, type_sets, outcomes, utility_func):
+    def __init__(self, n, type_sets, outcomes, utility_func, prior=None):
         self.outcomes, self.u = outcomes, utility_func
         self.n, self.type_sets = n, type_sets
+        self.prior = prior
 
         self.thetas = list()
         for _theta in itertools.product(*type_sets):
             self.thetas.append(list(_theta))
 
+        # utility tensor (#outcomes x #thetas x n), thetas are in the same
+        # (lexicographic) order as self.thetas
+        self.U = np.array([[self.u(EncodedList([x, *theta])) for theta in self.thetas] for x in self.outcomes])
+
     def _is_dsic(self, player, func):
         """
         _is_dsic reports whether player will report its true type
@@ -45,19 +54,27 @@ class Environment:
                 fhat = func.f(EncodedList(theta_hat))
                 ftrue = func.f(EncodedList(true_theta))
 
-                ui_fhat = self.u(EncodedList([fhat, *true_theta]))[player]
-                ui_ftrue = self.u(EncodedList([ftrue, *true_theta]))[player]
+                ui_fhat = self.u(EncodedList([fhat, *true_theta]))[player] + self._transfer(func, theta_hat, player)
+                ui_ftrue = self.u(EncodedList([ftrue, *true_theta]))[player] + self._transfer(func, true_theta, player)
 
                 if ui_fhat > ui_ftrue:
                     return False
 
         return True
 
+    @staticmethod
+    def _transfer(func, theta, player):
+        """transfer to player for reported theta, 0 if func has no transfers"""
+
+        if isinstance(func, Mechanism):
+            return func.t(EncodedList(theta))[player]
+        return 0
+
     def dsic(self, func):
         """
         dsic reports whether the given function is DSIC or not
 
-        func: SocialChoiceFunc
+        func: SocialChoiceFunc or Mechanism (utilities are quasi-linear in transfers)
         """
 
         for player in range(0, self.n):
@@ -101,4 +118,477 @@ class Environment:
 
         return np.any(compare)
 
+    def outcome_indices(self, func):
+        """
+        outcome_indices reports function as an array of outcome indices, f[k] is the outcome of self.thetas[k]
+
+        func: SocialChoiceFunc
+        """
+
+        index = {x: k for k, x in enumerate(self.outcomes)}
+        return np.array([index[func.f(EncodedList(theta))] for theta in self.thetas])
+
+    def interim_utilities(self, func, transfers=None):
+        """
+        interim_utilities reports interim expected utility of every player for every
+        (true type, reported type), when all the other players report truthfully
+            EU_i[t, r] = Σ_{Ѳ-i} P(Ѳ-i | t) (u_i(f(r, Ѳ-i), (t, Ѳ-i)) + t_i(r, Ѳ-i))
+        computed as a contraction of utility tensor with the prior,
+        big-O runtime O(#t1 * #t2 * ... * #tn * (#t1 + #t2 + ... + #tn)) for each function
+
+        func: SocialChoiceFunc, Mechanism, array of outcome indices (#thetas) or a batch (B x #thetas)
+        transfers: transfers (#thetas x n) or a batch (B x #thetas x n), taken from func if it is a Mechanism
+        return: list of interim utilities for each player, (#ti x #ti) or (B x #ti x #ti) for a batch
+        """
+
+        assert self.prior is not None, 'bayesian incentive compatibility requires a prior over types'
+
+        if isinstance(func, SocialChoiceFunc):
+            if isinstance(func, Mechanism):
+                transfers = np.array([func.t(EncodedList(theta)) for theta in self.thetas])
+            func = self.outcome_indices(func)
+
+        F = np.asarray(func)
+        batch = F.ndim == 2
+        F = F.reshape(-1, F.shape[-1])
+        sizes = [len(t) for t in self.type_sets]
+
+        interim = list()
+        for i in range(self.n):
+            # move type of player i to the front: (B x reported x rest), (X x true x rest)
+            Fi = np.moveaxis(F.reshape(-1, *sizes), i+1, 1).reshape(len(F), sizes[i], -1)
+            Ui = np.moveaxis(self.U[..., i].reshape(-1, *sizes), i+1, 1).reshape(len(self.outcomes), sizes[i], -1)
+            Pi = np.moveaxis(self.prior, i, 0).reshape(sizes[i], -1)
+            rest = np.arange(Fi.shape[2])
+
+            # utility[b, r, t, rest] = u_i(f(r, rest), (t, rest))
+            utility = Ui[Fi[:, :, None, :], np.arange(sizes[i])[None, None, :, None], rest]
+            if transfers is not None:
+                Ti = np.asarray(transfers)[..., i].reshape(-1, *sizes)
+                utility = utility + np.moveaxis(Ti, i+1, 1).reshape(len(F), sizes[i], 1, -1)
+
+            marginal = Pi.sum(axis=1)
+            conditional = np.divide(Pi, marginal[:, None], out=np.zeros_like(Pi), where=marginal[:, None] > 0)
+            eu = np.einsum('brtk,tk->btr', utility, conditional)
+            interim.append(eu if batch else eu[0])
+
+        return interim
+
+    def bic(self, func, transfers=None):
+        """
+        bic reports whether truthful reporting is a bayesian nash equilibrium, for every
+        player and every true type with positive probability
+
+        func: SocialChoiceFunc, Mechanism, array of outcome indices (#thetas) or a batch (B x #thetas)
+        transfers: transfers (#thetas x n) or a batch (B x #thetas x n), taken from func if it is a Mechanism
+        return: bool, or array of bool for a batch
+        """
+
+        is_bic = None
+        for i, eu in enumerate(self.interim_utilities(func, transfers)):
+            truthful = np.diagonal(eu, axis1=-2, axis2=-1)[..., :, None]
+            possible = np.moveaxis(self.prior, i, 0).reshape(eu.shape[-1], -1).sum(axis=1) > 0
+            ok = np.all((eu <= truthful + tolerance) | ~possible[:, None], axis=(-2, -1))
+            is_bic = ok if is_bic is None else is_bic & ok
+
+        return bool(is_bic) if np.ndim(is_bic) == 0 else is_bic
+
+    def function_id(self, f):
+        """
+        function_id reports id of the function, same as generated by SocialChoiceFunc.all
+
+        f: array of outcome indices, f[k] is the outcome of self.thetas[k]
+        """
+
+        id, radix = 0, len(self.outcomes)
+        for x in f:
+            id = id * radix + int(x)
+        return id + 1
+
+    def function(self, f):
+        """
+        function reports SocialChoiceFunc for an array of outcome indices
+
+        f: array of outcome indices, f[k] is the outcome of self.thetas[k]
+        """
+
+        theta_s = [EncodedList(theta) for theta in self.thetas]
+        mapping = [self.outcomes[x] for x in f]
+        return SocialChoiceFunc(self.function_id(f), theta_s, mapping)
+
+    def vcg(self, h=None):
+        """
+        vcg reports the Groves mechanism for a quasi-linear environment, utilities are
+        taken as valuations v_i(x, Ѳ), the outcome is allocatively efficient
+            k(Ѳ) = argmax_x Σ_j v_j(x, Ѳ)
+            t_i(Ѳ) = Σ_{j≠i} v_j(k(Ѳ), Ѳ) + h_i(Ѳ)
+        all the profiles and all the "without player i" optima are computed on the
+        utility tensor at once, big-O runtime O(#outcomes * n * #t1 * #t2 * ... * #tn)
+
+        h: h[k, i] Groves term of player i for self.thetas[k], must not depend on type of player i,
+           default is Clarke pivot h_i(Ѳ) = -max_x Σ_{j≠i} v_j(x, Ѳ)
+        return: Mechanism
+        """
+
+        V, num_thetas = self.U, self.U.shape[1]
+
+        welfare = V.sum(axis=2)                         # (#outcomes x #thetas)
+        k = welfare.argmax(axis=0)                      # efficient outcome for every theta
+        others = welfare[..., None] - V                 # welfare of all players except i
+        if h is None:
+            h = -others.max(axis=0)                     # clarke pivot
+        t = others[k, np.arange(num_thetas)] + np.asarray(h)
+
+        theta_s = [EncodedList(theta) for theta in self.thetas]
+        mapping = [self.outcomes[x] for x in k]
+        return Mechanism(self.function_id(k), theta_s, mapping, t.tolist())
+
+    def symmetries(self):
+        """symmetries reports the SymmetryGroup of the environment"""
+
+        return SymmetryGroup(self)
+
+
+class IncrementalChecker:
+    """
+    IncrementalChecker keeps dsic, expost and dictatorial verdicts of a social
+    choice function up to date while the outcome of one Ѳ is changed at a time
+
+    functions are represented by an array of outcome indices, f[k] is the index
+    of the outcome for Environment.thetas[k]
+
+    Attributes:
+        env: Environment
+        f: current function, array of outcome indices
+        dsic_violations: number of (player, Ѳ^, true type) pairs violating dsic
+        expost_violations: number of Ѳ for which f(Ѳ) is pareto dominated
+        non_best: non_best[i] number of Ѳ for which f(Ѳ) is not best for player i
+
+    Methods:
+        assign, lexicographic, gray, dsic, expost, dictatorial, function
+    """
+
+    def __init__(self, env, f=None):
+        self.env = env
+        U, sizes = env.U, [len(t) for t in env.type_sets]
+        num_thetas = U.shape[1]
+
+        # line[i][k, t] = index of Ѳ[k] with type of player i replaced by t-th type
+        # pos[i][k] = index of type of player i in Ѳ[k]
+        index = np.arange(num_thetas).reshape(sizes)
+        self.line, self.pos = list(), list()
+        for i in range(env.n):
+            rows = np.moveaxis(index, i, -1).reshape(-1, sizes[i])
+            line = np.empty((num_thetas, sizes[i]), dtype=int)
+            line[rows.ravel()] = np.repeat(rows, sizes[i], axis=0)
+            self.line.append(line)
+            self.pos.append(np.unravel_index(np.arange(num_thetas), sizes)[i])
+
+        # dominated[x, k] outcome x is pareto dominated at Ѳ[k]
+        # best[x, k, i] outcome x gives maximum utility to player i at Ѳ[k]
+        ge = np.all(U[:, None] >= U[None, :], axis=-1)
+        gt = np.any(U[:, None] > U[None, :], axis=-1)
+        self.dominated = np.any(ge & gt, axis=0)
+        self.best = U >= U.max(axis=0)
+
+        self.f = np.zeros(num_thetas, dtype=int) if f is None else np.array(f, dtype=int)
+        self._recount()
+
+    def _recount(self):
+        """recount all the violation counters for self.f from scratch"""
+
+        U, f, thetas = self.env.U, self.f, np.arange(len(self.f))
+
+        self.violations = list()
+        for i in range(self.env.n):
+            line = self.line[i]
+            # pair (Ѳ^ = Ѳ[k], true = line[k, t]) violates dsic if u(f(Ѳ^), true) > u(f(true), true)
+            self.violations.append(U[f[:, None], line, i] > U[f[line], line, i])
+
+        self.dsic_violations = int(sum(v.sum() for v in self.violations))
+        self.expost_violations = int(self.dominated[f, thetas].sum())
+        self.non_best = (~self.best[f, thetas]).sum(axis=0)
+
+    def assign(self, k, x):
+        """
+        assign changes outcome of Ѳ[k] to x and updates the violation counters
+        big-O runtime O(#t1 + #t2 + ... + #tn)
+
+        k: index of Ѳ in Environment.thetas
+        x: index of the new outcome
+        """
+
+        U, f = self.env.U, self.f
+        old = f[k]
+        if old == x:
+            return
+
+        self.expost_violations += int(self.dominated[x, k]) - int(self.dominated[old, k])
+        self.non_best += (~self.best[x, k]).astype(int) - (~self.best[old, k])
+        f[k] = x
+
+        for i in range(self.env.n):
+            violations, line = self.violations[i], self.line[i][k]
+
+            # Ѳ[k] as reported profile
+            hat = U[x, line, i] > U[f[line], line, i]
+            # Ѳ[k] as true profile, reported by the profiles on its line
+            true = U[f[line], k, i] > U[x, k, i]
+
+            self.dsic_violations += np.count_nonzero(hat) - np.count_nonzero(violations[k])
+            violations[k] = hat
+
+            column = violations[line, self.pos[i][k]]
+            self.dsic_violations += np.count_nonzero(true) - np.count_nonzero(column)
+            violations[line, self.pos[i][k]] = true
+
+    def lexicographic(self):
+        """
+        lexicographic generates all the social choice functions in id order (same as
+        SocialChoiceFunc.all), f is counted like an odometer and only the Ѳ changed by
+        a carry are reassigned, amortized less than 2 assignments per function
+
+        return: generator of self.f, (updated in place)
+        """
+
+        m, radix = len(self.f), len(self.env.outcomes)
+        for k in range(m):
+            self.assign(k, 0)
+        yield self.f
+
+        while True:
+            j = m - 1
+            while j >= 0 and self.f[j] == radix - 1:
+                self.assign(j, 0)
+                j -= 1
+            if j < 0:
+                return
+
+            self.assign(j, self.f[j] + 1)
+            yield self.f
+
+    def gray(self):
+        """
+        gray generates all the social choice functions in reflected gray code order,
+        consecutive functions differ in outcome of exactly one Ѳ
+
+        return: generator of self.f, (updated in place)
+        """
+
+        m, radix = len(self.f), len(self.env.outcomes)
+        for k in range(m):
+            self.assign(k, 0)
+        yield self.f
+
+        if radix < 2:
+            return
+
+        # loopless reflected mixed radix gray code (Knuth, TAOCP 7.2.1.1, algorithm M)
+        focus, direction = list(range(m+1)), [1 for _ in range(m)]
+        while True:
+            j = focus[0]
+            focus[0] = 0
+            if j == m:
+                return
+
+            x = self.f[j] + direction[j]
+            self.assign(j, x)
+            if x == 0 or x == radix - 1:
+                direction[j] = -direction[j]
+                focus[j] = focus[j+1]
+                focus[j+1] = j + 1
+            yield self.f
+
+    def dsic(self):
+        """dsic reports whether the current function is DSIC"""
+
+        return self.dsic_violations == 0
+
+    def expost(self):
+        """expost reports whether the current function is expost efficient"""
+
+        return self.expost_violations == 0
+
+    def dictatorial(self):
+        """dictatorial reports whether the current function is dictatorial"""
+
+        return bool(np.any(self.non_best == 0))
+
+    def id(self):
+        """id of the current function as generated by SocialChoiceFunc.all"""
+
+        return self.env.function_id(self.f)
+
+    def function(self):
+        """function reports the current function as SocialChoiceFunc"""
+
+        return self.env.function(self.f)
+
+
+class SymmetryGroup:
+    """
+    SymmetryGroup represents the player/type/outcome permutations of an environment
+    which leave its utility table unchanged
+
+    a symmetry is (π, σ, τ), π permutes players, σi maps types of player i to types
+    of player π(i) and τ permutes outcomes such that
+        u_π(i)(τ(x), g(Ѳ)) = u_i(x, Ѳ), where g(Ѳ)_π(i) = σi(Ѳi)
+    dsic, expost and dictatorial are invariant under symmetries, so all the functions
+    in an orbit have the same verdict
+
+    Attributes:
+        env: Environment
+        P: P[g, k] index of the image of Environment.thetas[k] under symmetry g
+        T: T[g, x] index of the image of outcome x under symmetry g
+
+    Methods:
+        orbit, canonical, representatives
+    """
+
+    def __init__(self, env):
+        self.env = env
+        U, n, sizes = env.U, env.n, [len(t) for t in env.type_sets]
+        num_thetas = U.shape[1]
+        UT = U.reshape(U.shape[0], *sizes, n)
+
+        # type signature: sorted utilities of player i over all (x, Ѳ) with Ѳi = t
+        type_sig = list()
+        for i in range(n):
+            ui = np.moveaxis(UT[..., i], i+1, 0).reshape(sizes[i], -1)
+            type_sig.append([tuple(np.sort(row)) for row in ui])
+        player_sig = [sorted(sig) for sig in type_sig]
+
+        # outcomes with identical utility columns are interchangeable
+        outcome_class = dict()
+        for x in range(U.shape[0]):
+            outcome_class.setdefault(U[x].tobytes(), list()).append(x)
+        swaps = [list(itertools.permutations(c)) for c in outcome_class.values()]
+
+        index = np.arange(num_thetas).reshape(sizes)
+        P, T = list(), list()
+        for pi in itertools.permutations(range(n)):
+            if any(player_sig[i] != player_sig[pi[i]] for i in range(n)):
+                continue
+
+            candidates = [self._bijections(type_sig[i], type_sig[pi[i]]) for i in range(n)]
+            for sigma in itertools.product(*candidates):
+                # p[k] = index of g(Ѳ[k]), g(Ѳ)_π(i) = σi(Ѳi)
+                coords = np.unravel_index(np.arange(num_thetas), sizes)
+                image = [None for _ in range(n)]
+                for i in range(n):
+                    image[pi[i]] = np.array(sigma[i])[coords[i]]
+                p = index[tuple(image)]
+
+                # V[x, p[k], π(i)] = U[x, k, i], τ must map V[x] to U[τ(x)]
+                V = np.empty_like(U)
+                V[:, p[:, None], np.array(pi)[None, :]] = U
+                tau = self._outcome_map(V, outcome_class)
+                if tau is None:
+                    continue
+
+                for swap in itertools.product(*swaps):
+                    within = np.arange(U.shape[0])
+                    for c, perm in zip(outcome_class.values(), swap):
+                        within[c] = perm
+                    P.append(p)
+                    T.append(within[tau])
+
+        self.P, self.T = np.array(P), np.array(T)
+        self.Pinv = np.argsort(self.P, axis=1)
+
+        # image position j under g is known once the first max(Pinv[g, :j+1]) + 1 outcomes
+        # are fixed, _new[k][g] positions which become known when k-th outcome is fixed
+        known = np.sum(np.maximum.accumulate(self.Pinv, axis=1)[None] < np.arange(num_thetas+2)[:, None, None], axis=2)
+        self._new = [[list(range(known[k][g], known[k+1][g])) for g in range(len(P))] for k in range(num_thetas+1)]
+        identity = np.all(self.P == np.arange(num_thetas), axis=1) & np.all(self.T == np.arange(U.shape[0]), axis=1)
+        self._nontrivial = [g for g in range(len(P)) if not identity[g]]
+
+    @staticmethod
+    def _bijections(source, target):
+        """all signature preserving bijections from source types to target types"""
+
+        classes = dict()
+        for t, sig in enumerate(target):
+            classes.setdefault(sig, list()).append(t)
+
+        choices = [classes.get(sig, list()) for sig in source]
+        for bijection in itertools.product(*choices):
+            if len(set(bijection)) == len(bijection):
+                yield bijection
+
+    @staticmethod
+    def _outcome_map(V, outcome_class):
+        """outcome permutation τ with U[τ(x)] = V[x] if exist"""
+
+        free = {key: list(c) for key, c in outcome_class.items()}
+        tau = np.empty(V.shape[0], dtype=int)
+        for x in range(V.shape[0]):
+            targets = free.get(V[x].tobytes())
+            if not targets:
+                return None
+            tau[x] = targets.pop(0)
+        return tau
+
+    def __len__(self):
+        return len(self.P)
+
+    def images(self, f):
+        """images of function f under all the symmetries, images[g, P[g, k]] = T[g, f[k]]"""
+
+        images = np.empty_like(self.P)
+        np.put_along_axis(images, self.P, np.take_along_axis(self.T, np.broadcast_to(f, self.P.shape), axis=1), axis=1)
+        return images
+
+    def orbit(self, f):
+        """orbit reports all the distinct functions symmetric to f"""
+
+        return np.unique(self.images(np.asarray(f)), axis=0)
+
+    def canonical(self, f):
+        """canonical reports whether f is the lexicographically smallest function of its orbit"""
+
+        f = np.asarray(f)
+        images = self.images(f)
+        first = np.argmax(images != f, axis=1)
+        return not np.any(images[np.arange(len(first)), first] < f[first])
+
+    def representatives(self, checker):
+        """
+        representatives walks only the canonical function of every orbit in
+        lexicographic order, prefixes which can not be canonical are pruned
+
+        checker: IncrementalChecker of the environment
+        return: generator of checker.f (updated in place)
+        """
+
+        m, radix = len(checker.f), len(self.env.outcomes)
+        Pinv, T = self.Pinv.tolist(), self.T.tolist()
+        prefix = [0 for _ in range(m)]
+
+        def compare(g, k):
+            """compare image of prefix under g with prefix on positions known at k"""
+
+            for j in self._new[k][g]:
+                h = T[g][prefix[Pinv[g][j]]]
+                if h != prefix[j]:
+                    return -1 if h < prefix[j] else 1
+            return 0
+
+        def walk(k, tied):
+            # tied: symmetries whose image matches the prefix on all known positions
+            if k == m:
+                yield checker.f
+                return
+
+            for x in range(radix):
+                prefix[k] = x
+                status = [(g, compare(g, k)) for g in tied]
+                if any(c < 0 for _, c in status):
+                    continue
+
+                checker.assign(k, x)
+                yield from walk(k+1, [g for g, c in status if c == 0])
+
+        yield from walk(0, self._nontrivial)
+
 # vim: set path=./:
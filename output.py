@@ -0,0 +1,108 @@
+import sys
+import json
+import struct
+
+BUFFER_SIZE = 1 << 20
+
+# binary format: header (magic, #thetas, #outcomes, id bytes, index bytes, flags) followed by
+# one record per function, (id, f[0], f[1], ..., f[#thetas-1]) all little endian unsigned,
+# records end with a uint64 orbit size if BINARY_ORBIT_SIZE flag is set
+BINARY_MAGIC = b'SCF2'
+BINARY_HEADER = struct.Struct('<4sIIIII')
+BINARY_ORBIT_SIZE = 1
+
+
+class TextWriter:
+    """TextWriter prints social choice functions in the SocialChoiceFunc format"""
+
+    def __init__(self, env, stream, orbit_sizes=False):
+        self.env, self.stream = env, stream
+
+    def write(self, f, orbit_size=None):
+        """
+        write a function
+
+        f: array of outcome indices, f[k] is the outcome of env.thetas[k]
+        orbit_size: size of the symmetry orbit of f, printed if given
+        """
+
+        self.stream.write(repr(self.env.function(f)))
+        if orbit_size is not None:
+            self.stream.write(f'orbit size: {orbit_size}\n')
+        self.stream.write('\n')
+
+    def close(self):
+        self.stream.flush()
+
+
+class JsonlWriter:
+    """
+    JsonlWriter streams one compact json record per function, {"id": id, "f": [outcome indices]}
+    the first record describes the indices, {"thetas": [...], "outcomes": [...]}
+    """
+
+    def __init__(self, env, stream, orbit_sizes=False):
+        self.env, self.stream = env, stream
+        header = {'thetas': env.thetas, 'outcomes': env.outcomes}
+        self.stream.write(json.dumps(header, separators=(',', ':'), ensure_ascii=False) + '\n')
+
+    def write(self, f, orbit_size=None):
+        record = f'{{"id":{self.env.function_id(f)},"f":[{",".join(map(str, f.tolist()))}]'
+        if orbit_size is not None:
+            record += f',"orbit_size":{orbit_size}'
+        self.stream.write(record + '}\n')
+
+    def close(self):
+        self.stream.flush()
+
+
+class BinaryWriter:
+    """
+    BinaryWriter streams fixed size binary records, see BINARY_HEADER for the format
+    orbit_sizes: every record ends with orbit size of the function (BINARY_ORBIT_SIZE flag)
+    """
+
+    def __init__(self, env, stream, orbit_sizes=False):
+        self.env, self.stream, self.orbit_sizes = env, stream, orbit_sizes
+
+        m, radix = len(env.thetas), len(env.outcomes)
+        self.id_bytes = max(1, ((radix ** m).bit_length() + 7) // 8)
+        self.index_dtype = '<u1' if radix <= 1 << 8 else '<u2' if radix <= 1 << 16 else '<u4'
+        index_bytes = int(self.index_dtype[-1])
+        flags = BINARY_ORBIT_SIZE if orbit_sizes else 0
+        self.stream.write(BINARY_HEADER.pack(BINARY_MAGIC, m, radix, self.id_bytes, index_bytes, flags))
+
+    def write(self, f, orbit_size=None):
+        assert (orbit_size is not None) == self.orbit_sizes, 'orbit size is required iff writer has orbit sizes'
+
+        id = self.env.function_id(f)
+        record = id.to_bytes(self.id_bytes, 'little') + f.astype(self.index_dtype).tobytes()
+        if self.orbit_sizes:
+            record += orbit_size.to_bytes(8, 'little')
+        self.stream.write(record)
+
+    def close(self):
+        self.stream.flush()
+
+
+writers = {'text': TextWriter, 'jsonl': JsonlWriter, 'binary': BinaryWriter}
+
+
+def open_stream(path, binary=False):
+    """
+    open_stream opens a buffered output stream, stdout if path is None
+
+    path: output file path
+    binary: open stream for bytes
+    """
+
+    if path is None and binary:
+        sys.stdout.flush()
+        return sys.stdout.buffer
+    if path is None:
+        return sys.stdout
+    if binary:
+        return open(path, 'wb', buffering=BUFFER_SIZE)
+    return open(path, 'w', buffering=BUFFER_SIZE, encoding='utf-8')
+
+# vim: set path=./:
@@ -0,0 +1,140 @@
+import json
+import time
+import functools
+import contextlib
+
+# profiler is disabled by default, all the hooks check this flag first and do nothing else
+enabled = False
+
+# timers[name] = [calls, total time in seconds], counters[name] = count
+timers, counters = dict(), dict()
+
+
+def enable():
+    """enable profiler and reset all the timers and counters"""
+
+    global enabled
+    enabled = True
+    reset()
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    timers.clear()
+    counters.clear()
+
+
+def _add_time(name, elapsed):
+    timer = timers.setdefault(name, [0, 0.0])
+    timer[0] += 1
+    timer[1] += elapsed
+
+
+@contextlib.contextmanager
+def phase(name):
+    """phase times the enclosed block, e.g. with profiler.phase('parse'): ..."""
+
+    if not enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _add_time(name, time.perf_counter() - start)
+
+
+def profiled(name):
+    """profiled decorator times every call of the function as phase name"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _add_time(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def call(name, func, *args, **kwargs):
+    """call func and time it as name, e.g. profiler.call('linprog', linprog, c, ...)"""
+
+    if not enabled:
+        return func(*args, **kwargs)
+
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _add_time(name, time.perf_counter() - start)
+
+
+def count(name, k=1):
+    """count adds k to counter name, call sites in hot loops should check profiler.enabled first"""
+
+    if enabled:
+        counters[name] = counters.get(name, 0) + k
+
+
+def counted(func, name):
+    """
+    counted wraps func to count its calls as name, func is returned as it is
+    if profiler is disabled, so wrapping costs nothing in that case
+    """
+
+    if not enabled:
+        return func
+
+    def wrapper(*args, **kwargs):
+        counters[name] = counters.get(name, 0) + 1
+        return func(*args, **kwargs)
+    wrapper.__wrapped__ = func
+    return wrapper
+
+
+def iterate(iterable, name):
+    """iterate counts items of iterable as name, iterable is returned as it is if profiler is disabled"""
+
+    if not enabled:
+        return iterable
+
+    def wrapper():
+        for item in iterable:
+            counters[name] = counters.get(name, 0) + 1
+            yield item
+    return wrapper()
+
+
+def report():
+    """report timers, counters and derived rates as a dictionary"""
+
+    phases = {name: {'calls': calls, 'time': total} for name, (calls, total) in timers.items()}
+    derived = dict()
+    if 'linprog' in timers:
+        derived['linprog_calls'], derived['linprog_time'] = timers['linprog']
+    if counters.get('scf_evaluated') and timers.get('q4.check', [0, 0.0])[1] > 0:
+        derived['scf_per_second'] = counters['scf_evaluated'] / timers['q4.check'][1]
+
+    return {'phases': phases, 'counters': dict(counters), 'derived': derived}
+
+
+def dump(path=None):
+    """dump report as json to path, or return it as a string if path is None"""
+
+    text = json.dumps(report(), indent=2)
+    if path is None:
+        return text
+    with open(path, 'w') as outfile:
+        outfile.write(text + '\n')
+
+# vim: set path=./:
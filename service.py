@@ -0,0 +1,193 @@
+import io
+import os
+import json
+import time
+import signal
+import socket
+import logging
+import asyncio
+import argparse
+import threading
+import traceback
+import collections
+
+DEFAULT_SOCKET = '/tmp/gt-solver.sock'
+
+# ------------------------------------ server ------------------------------------
+
+
+class ModelCache:
+    """
+    ModelCache is a thread safe LRU of parsed models (Game, TwoPlayer, TwoPlayerZeroSum,
+    Environment) keyed by question kind, path and modification times of the testcase files
+
+    Attributes:
+        capacity: maximum number of models
+        hits, misses: lookup statistics
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity, self.hits, self.misses = capacity, 0, 0
+        self.models, self.lock = collections.OrderedDict(), threading.Lock()
+
+    @staticmethod
+    def key(question, testcase):
+        """key changes when any file of the testcase is modified"""
+
+        path = os.path.realpath(testcase)
+        mtimes = list()
+        for name in ('meta.txt', 'utility.csv', 'prior.csv'):
+            try:
+                mtimes.append(os.stat(os.path.join(path, name)).st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(None)
+        return (question, path, *mtimes)
+
+    def get(self, question, testcase):
+        """get model of testcase for question, loaded with main.load on a miss"""
+
+        import main
+
+        key = self.key(question, testcase)
+        with self.lock:
+            if key in self.models:
+                self.hits += 1
+                self.models.move_to_end(key)
+                return self.models[key]
+            self.misses += 1
+
+        # models are loaded outside of the lock, two concurrent misses may both load
+        model = main.load(question, testcase)
+        with self.lock:
+            self.models[key] = model
+            self.models.move_to_end(key)
+            while len(self.models) > self.capacity:
+                self.models.popitem(last=False)
+        return model
+
+
+def _solve(models, request):
+    """solve request with a cached model, reports response dictionary"""
+
+    import main
+
+    question, testcase = request['q'], request['testcase']
+    options = request.get('options', dict())
+    if options.get('mode') == 'binary' and options.get('out') is None:
+        return {'status': 'error', 'error': 'binary output requires "out" file'}
+
+    start, stdout = time.perf_counter(), io.StringIO()
+    try:
+        model = models.get(question, testcase) if question in (1, 2, 3, 4) else None
+        main.solve(question, testcase, model=model, file=stdout, **options)
+    except Exception:
+        return {'status': 'error', 'error': traceback.format_exc(), 'time': time.perf_counter() - start}
+
+    return {'status': 'ok', 'output': stdout.getvalue(), 'time': time.perf_counter() - start}
+
+
+async def _handle(reader, writer, models, executor):
+    """handle a client connection, one json request and one json response per line"""
+
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+
+            try:
+                request = json.loads(line)
+            except ValueError as error:
+                response = {'status': 'error', 'error': f'invalid request: {error}'}
+            else:
+                if request.get('op') == 'stats':
+                    response = {'status': 'ok', 'models': len(models.models),
+                                'hits': models.hits, 'misses': models.misses}
+                else:
+                    response = await loop.run_in_executor(executor, _solve, models, request)
+
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+    finally:
+        writer.close()
+
+
+async def _serve(path, capacity, workers):
+    import concurrent.futures
+    import main
+    main.preload()  # import all the solvers before accepting requests
+
+    models = ModelCache(capacity)
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+
+    # stop gracefully on SIGTERM, so the socket file is removed
+    stop = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+    except (ValueError, RuntimeError, NotImplementedError):
+        logging.info('SIGTERM handler is available only in main thread')
+
+    if os.path.exists(path):
+        os.remove(path)
+    server = await asyncio.start_unix_server(lambda r, w: _handle(r, w, models, executor), path=path)
+    print(f'solver service listening on {path}', flush=True)
+    async with server:
+        await stop.wait()
+    executor.shutdown(wait=False)
+
+
+def serve(path=DEFAULT_SOCKET, capacity=64, workers=4):
+    """
+    serve solve requests on unix socket path until interrupted
+
+    path: unix socket path
+    capacity: number of parsed models kept in memory
+    workers: number of threads solving requests concurrently
+    """
+
+    try:
+        asyncio.run(_serve(path, capacity, workers))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+# ------------------------------------ client ------------------------------------
+
+
+def request(path, question, testcase, options=None, timeout=None):
+    """
+    request sends a solve request to the service, only standard library is imported
+
+    path: unix socket path of the service
+    question: question number 1, 2, 3 or 4
+    testcase: path to the testcase folder (relative paths are resolved by the client)
+    options: q4 options (relative out path is resolved by the client)
+    return: response dictionary, {'status', 'output', 'time'} or {'status', 'error'}
+    """
+
+    options = dict(options or dict())
+    if options.get('out') is not None:
+        options['out'] = os.path.abspath(options['out'])
+
+    message = {'q': question, 'testcase': os.path.abspath(testcase), 'options': options}
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path)
+        client.sendall(json.dumps(message).encode() + b'\n')
+        with client.makefile('rb') as response:
+            return json.loads(response.readline())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='resident solver service over a unix socket')
+    parser.add_argument('--socket', type=str, default=DEFAULT_SOCKET, help='unix socket path')
+    parser.add_argument('--models', type=int, default=64, help='number of parsed models kept in memory')
+    parser.add_argument('--workers', type=int, default=4, help='number of concurrent solver threads')
+    args = parser.parse_args()
+
+    serve(args.socket, args.models, args.workers)
+
+# vim: set path=./:
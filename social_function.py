@@ -39,12 +39,11 @@ class SocialChoiceFunc:
     def __repr__(self):
         """ pretty print for SocialChoiceFunc  """
 
-        repr = f'\nsocial choice function: #{self.id}\n'
-        repr += '====================================\n'
+        lines = [f'\nsocial choice function: #{self.id}', '====================================']
         for theta in self.theta_s:
-            repr += f'{theta} -> {self.func[theta.encode()]}\n'
-        repr += '====================================\n'
-        return repr
+            lines.append(f'{theta} -> {self.func[theta.encode()]}')
+        lines.append('====================================\n')
+        return '\n'.join(lines)
 
     def __str__(self):
         return self.__repr__()
@@ -68,4 +67,37 @@ class SocialChoiceFunc:
             id += 1
             yield SocialChoiceFunc(id, theta_s, mapping)
 
+
+class Mechanism(SocialChoiceFunc):
+    """
+    Mechanism class is a SocialChoiceFunc with transfers for quasi-linear environments,
+    utility of player i is u_i(f(Ѳ^), Ѳ) + t_i(Ѳ^), where Ѳ^ is reported types
+
+    Attributes:
+        payments: mapping of transfers (list, one for each player) to given theta_s
+
+    Methods:
+        t: t reports the transfers of all the players for a given Ѳ
+    """
+    def __init__(self, id, theta_s, mapping_s, payment_s):
+        super().__init__(id, theta_s, mapping_s)
+        self.payments = dict()
+        for theta, payment in zip(theta_s, payment_s):
+            self.payments[theta.encode()] = payment
+
+    def t(self, theta):
+        try:
+            return self.payments[theta.encode()]
+        except KeyError:
+            logging.error(f'Invalid Ѳ, no transfers available for {theta}')
+
+    def __repr__(self):
+        """ pretty print for Mechanism """
+
+        lines = [f'\nmechanism: #{self.id}', '====================================']
+        for theta in self.theta_s:
+            lines.append(f'{theta} -> {self.func[theta.encode()]}, t = {self.payments[theta.encode()]}')
+        lines.append('====================================\n')
+        return '\n'.join(lines)
+
 # vim: set path=./:
@@ -0,0 +1,71 @@
+import os
+import sys
+import json
+import subprocess
+import pytest
+
+import batch
+
+
+def test_batch(tmp_path):
+    """batch jobs report output, errors and timeouts without stalling other jobs"""
+
+    # reading meta.txt of hang testcase blocks forever (fifo without writer)
+    os.mkdir(tmp_path / 'hang')
+    os.mkfifo(tmp_path / 'hang' / 'meta.txt')
+
+    jobs = [{'id': 'game', 'q': 1, 'testcase': 'testdir/test.game/test.1'},
+            {'id': 'md', 'q': 4, 'testcase': 'testdir/test.md/test.1', 'options': {'mode': 'count'}},
+            {'id': 'missing', 'q': 1, 'testcase': str(tmp_path / 'missing')},
+            {'id': 'hang', 'q': 1, 'testcase': str(tmp_path / 'hang')}]
+    manifest, results_path = tmp_path / 'manifest.jsonl', tmp_path / 'results.jsonl'
+    manifest.write_text('# batch test\n' + '\n'.join(json.dumps(job) for job in jobs) + '\n')
+
+    results = batch.run(str(manifest), str(results_path), jobs=2, timeout=2)
+    results = {result['id']: result for result in results}
+
+    assert results['game']['status'] == 'ok', results['game']['error']
+    assert "psne: {('a', 'p')}" in results['game']['output'], 'q1 output failed'
+    assert results['md']['status'] == 'ok', results['md']['error']
+    assert 'valid functions: 2' in results['md']['output'], 'q4 count failed'
+    assert results['missing']['status'] == 'error' and 'FileNotFoundError' in results['missing']['error']
+    assert results['hang']['status'] == 'timeout', 'hung job did not time out'
+
+    written = [json.loads(line) for line in results_path.read_text().splitlines()]
+    assert sorted(result['id'] for result in written) == sorted(results), 'results file failed'
+
+
+def test_batch_timeout_starts_with_job(tmp_path):
+    """time limit of a job does not include solver imports of a new worker"""
+
+    os.mkdir(tmp_path / 'hang')
+    os.mkfifo(tmp_path / 'hang' / 'meta.txt')
+
+    # worker replacing the hung worker imports numpy and scipy before it runs the game job
+    jobs = [{'id': 'hang', 'q': 1, 'testcase': str(tmp_path / 'hang')},
+            {'id': 'game', 'q': 1, 'testcase': 'testdir/test.game/test.1'}]
+    manifest, results_path = tmp_path / 'manifest.jsonl', tmp_path / 'results.jsonl'
+    manifest.write_text('\n'.join(json.dumps(job) for job in jobs) + '\n')
+
+    results = {result['id']: result for result in batch.run(str(manifest), str(results_path), jobs=1, timeout=0.25)}
+    assert results['hang']['status'] == 'timeout', 'hung job did not time out'
+    assert results['game']['status'] == 'ok', results['game']['error']
+
+
+def test_batch_failures(tmp_path):
+    """binary output without out file is rejected, cli exits with 1 if a job fails"""
+
+    manifest = tmp_path / 'manifest.jsonl'
+    manifest.write_text(json.dumps({'q': 4, 'testcase': 'testdir/test.md/test.1', 'options': {'mode': 'binary'}}))
+    with pytest.raises(ValueError, match='binary output requires "out" file'):
+        batch.read_manifest(str(manifest))
+
+    command = [sys.executable, '-W', 'ignore', 'main.py', '--batch', str(manifest), '--results',
+               str(tmp_path / 'results.jsonl'), '--jobs', '1']
+    manifest.write_text(json.dumps({'q': 1, 'testcase': 'testdir/test.game/test.1'}) + '\n')
+    assert subprocess.run(command, capture_output=True).returncode == 0, 'batch of ok jobs failed'
+
+    manifest.write_text(json.dumps({'q': 1, 'testcase': str(tmp_path / 'missing')}) + '\n')
+    assert subprocess.run(command, capture_output=True).returncode == 1, 'failed batch exited with 0'
+
+# vim: set path=./:
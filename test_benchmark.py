@@ -0,0 +1,35 @@
+import itertools
+
+import benchmark
+from game import Game
+
+
+def test_generators():
+    """generated games are seeded and have the promised structure"""
+
+    n, s, u = benchmark.zero_sum_game(0, (3, 4))
+    assert [len(si) for si in s] == [3, 4], 'zero sum game size failed'
+    for sv in itertools.product(*s):
+        assert sum(u(sv)) == 0, 'zero sum game failed'
+
+    for seed in range(3):
+        n, s, u = benchmark.potential_game(seed, (3, 3, 2))
+        assert Game(n, s, u).psne() is not None, 'potential game has no psne'
+
+    _, s1, u1 = benchmark.random_game(7, (3, 3))
+    _, s2, u2 = benchmark.random_game(7, (3, 3))
+    assert all(u1(sv) == u2(sv) for sv in itertools.product(*s1)), 'random game is not seeded'
+
+
+def test_measure_and_compare():
+    """measurement reports operation counts, compare reports slowdowns only"""
+
+    result = benchmark.measure(benchmark.solve_psne, benchmark.random_game(0, (4, 4)), repeat=1)
+    assert result['operations'] == {'utility_lookups': 32}, f'operations got {result["operations"]}'
+    assert result['peak_memory'] > 0 and result['time'] > 0
+
+    baseline = {'a': {'time': 0.010}, 'b': {'time': 0.010}, 'c': {'time': 0.0001}}
+    current = {'a': {'time': 0.011}, 'b': {'time': 0.020}, 'c': {'time': 0.0009}, 'd': {'time': 1.0}}
+    assert benchmark.compare(baseline, current) == [('b', 0.010, 0.020)], 'compare failed'
+
+# vim: set path=./:
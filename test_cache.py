@@ -0,0 +1,80 @@
+import os
+import shutil
+import contextlib
+
+import util
+import main
+from cache import ResultCache
+
+
+def test_key(tmp_path):
+    """key ignores comments, whitespace and row order, but not the payoffs"""
+
+    testcase = tmp_path / 'game'
+    shutil.copytree('testdir/test.game/test.1', testcase)
+    key = ResultCache.key(str(testcase), 1)
+
+    meta = (testcase / 'meta.txt').read_text()
+    (testcase / 'meta.txt').write_text('# another comment\n' + meta.replace(', ', ','))
+    header, *rows = (testcase / 'utility.csv').read_text().splitlines()
+    (testcase / 'utility.csv').write_text('\n'.join([header, *reversed(rows)]) + '\n')
+    assert ResultCache.key(str(testcase), 1) == key, 'normalized game changed the key'
+    assert ResultCache.key(str(testcase), 2) != key, 'question did not change the key'
+
+    (testcase / 'utility.csv').write_text('\n'.join([header, *rows[:-1], 'c, r, 1, 2']) + '\n')
+    assert ResultCache.key(str(testcase), 1) != key, 'payoffs did not change the key'
+
+
+def test_eviction(tmp_path, monkeypatch):
+    """least recently used results are evicted first"""
+
+    cache = ResultCache(str(tmp_path), max_bytes=200)
+    cache.put('a', 'x' * 50)
+    cache.put('b', 'x' * 50)
+    os.utime(tmp_path / 'a.json', (1, 1))
+    os.utime(tmp_path / 'b.json', (2, 2))
+    assert cache.get('a') == 'x' * 50, 'cached result failed'
+
+    cache.put('c', 'x' * 50)
+    assert cache.get('b') is None, 'least recently used result was not evicted'
+    assert cache.get('a') is not None and cache.get('c') is not None, 'recently used result was evicted'
+
+    # a result evicted by another process between scandir and stat is skipped
+    scandir = os.scandir
+    def racing(directory):
+        entries = list(scandir(directory))
+        os.remove(tmp_path / 'a.json')
+        return contextlib.nullcontext(iter(entries))
+
+    monkeypatch.setattr(os, 'scandir', racing)
+    cache.put('d', 'x' * 50)
+    assert cache.get('c') is not None and cache.get('d') is not None, 'result was evicted'
+
+
+def test_solve_cached(tmp_path, capsys, monkeypatch):
+    """second solve prints cached output without parsing the game"""
+
+    cache = ResultCache(str(tmp_path))
+    main.solve(1, 'testdir/test.game/test.1', cache=cache)
+    solved = capsys.readouterr().out
+
+    def parse(testcase):
+        raise AssertionError('cached game was parsed')
+
+    monkeypatch.setattr(util, 'parse', parse)
+    main.solve(1, 'testdir/test.game/test.1', cache=cache)
+    assert capsys.readouterr().out == solved, 'cached output failed'
+
+
+def test_solve_options_key(tmp_path, capsys):
+    """q4 solved with default options given explicitly (cli) or omitted (library) is cached once"""
+
+    cache = ResultCache(str(tmp_path))
+    main.solve(4, 'testdir/test.md/test.1', cache=cache)
+    main.solve(4, 'testdir/test.md/test.1', cache=cache, symmetry=False, representatives=False, mode='text', out=None)
+    main.solve(4, 'testdir/test.md/test.1', cache=cache, mode='count')
+    capsys.readouterr()
+
+    assert len(os.listdir(tmp_path)) == 2, 'same q4 solve cached under different keys'
+
+# vim: set path=./:
@@ -1,7 +1,11 @@
 import logging
+import itertools
+import tracemalloc
+import numpy as np
 
-from game import Game
+from game import Game, MutableGame, weak_dominance
 import util
+import benchmark
 
 
 def test_strong_dominant():
@@ -45,6 +49,13 @@ def test_weak_dominant():
 
     assert real_wdse == wdse, 'wdse failed'
 
+    # c weakly dominates a and b, although it does not weakly dominate max(a, b)
+    s = [['a', 'b', 'c'], ['p', 'q', 'r', 't']]
+    rows = {'a': [1, 0, 1, 0], 'b': [1, 0, 0, 1], 'c': [1, 0, 1, 1]}
+    u = util.make_utility(2, {f'{si},{sj}': [rows[si][k], 0] for si in s[0] for k, sj in enumerate(s[1])})
+    assert Game(2, s, u).weakly_dominant_strategy(1) == 'c', 'weakly dominant strategy failed'
+    assert MutableGame(2, s, u).weakly_dominant_strategy(1) == 'c', 'weakly dominant strategy failed'
+
 def test_psne():
     """test psne calculation"""
 
@@ -98,4 +109,161 @@ def test_minmax():
         assert minmax_value[i-1] == value, 'minmax value failed'
         assert minmax_strategy[i-1] == strategy, 'minmax strategy failed'
 
+
+def test_sparse_game():
+    """test solvers on sparse utility store against the same game with dense utility"""
+
+    for seed, sizes in enumerate([(3, 3), (4, 5), (3, 3, 3), (2, 3, 2, 3)]):
+        for density in (0.2, 0.6, 1.0):
+            n, s, u = benchmark.sparse_game(seed, sizes, density)
+            dense = util.make_utility(n, {','.join(sv): u(sv) for sv in itertools.product(*s)})
+            sparse, game = Game(n, s, u), Game(n, s, dense)
+
+            assert sparse._store() is not None, 'sparse store not used'
+            assert sparse.psne() == game.psne(), 'psne failed'
+            for i in range(1, n+1):
+                assert sparse.maxmin(i) == game.maxmin(i), 'maxmin failed'
+                assert sparse.minmax(i) == game.minmax(i), 'minmax failed'
+                assert sparse.weakly_dominant_strategy(i) == game.weakly_dominant_strategy(i), 'wds failed'
+
+    # psne of a subgame, strategies removed by iterative elimination
+    n, s, u = util.parse('testdir/test.game/test.4')
+    assert Game(n, s, u).psne() == {('a', 'p'), ('c', 'r')}, 'psne failed'
+    subgame = Game(n, [['b', 'c'], ['p', 'q']], u)
+    assert subgame.psne() == {('c', 'p'), ('c', 'q')}, 'psne of subgame failed'
+
+
+def test_huge_sparse_game():
+    """psne of a sparse game with 2.5 * 10^9 strategy vectors, dense arrays would need at least 2.5 GB"""
+
+    size = 50000
+    s = [[f'a{k}' for k in range(size)], [f'b{k}' for k in range(size)]]
+    mapping = {f'a{k},b{k}': [1.0, 1.0] for k in range(size)}
+    mapping['a0,b1'] = [0.5, 2.0]
+    u = util.SparseUtility(s, mapping, default=[0.0, 0.0])
+
+    tracemalloc.start()
+    psne = Game(2, s, u).psne()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # (a0, b0) is not a psne, player 2 deviates to b1; every missing strategy vector is on a line with 1 > 0
+    assert psne == {(f'a{k}', f'b{k}') for k in range(1, size)}, 'psne of huge sparse game failed'
+    assert peak < 512 * 1024 * 1024, f'psne of huge sparse game used {peak} bytes'
+    assert Game(2, s, u).maxmin(2) == (0.0, set(s[1])), 'maxmin of huge sparse game failed'
+
+
+def test_huge_sparse_game_open_lines():
+    """psne of huge sparse games in which the lines of the last player have no utility above default"""
+
+    size = 50000
+    s = [[f'a{k}' for k in range(size)], [f'b{k}' for k in range(size)]]
+
+    # every column has 1 > 0 for player 1, so there is no psne
+    u = util.SparseUtility(s, {f'a{k},b{k}': [1.0, -1.0] for k in range(size)}, default=[0.0, 0.0])
+    assert Game(2, s, u).psne() is None, 'psne of huge sparse game failed'
+
+    # only the column of b0 has no stored utility, every (ak, b0) is a psne
+    u = util.SparseUtility(s, {f'a{k},b{k}': [1.0, -1.0] for k in range(1, size)}, default=[0.0, 0.0])
+    assert Game(2, s, u).psne() == {(f'a{k}', 'b0') for k in range(size)}, 'psne of huge sparse game failed'
+
+    # same games against dense utility
+    small = [Si[:30] for Si in s]
+    for start in (0, 1):
+        mapping = {f'a{k},b{k}': [1.0, -1.0] for k in range(start, 30)}
+        sparse = util.SparseUtility(small, mapping, default=[0.0, 0.0])
+        dense = util.make_utility(2, {','.join(sv): sparse(sv) for sv in itertools.product(*small)})
+        assert Game(2, small, sparse).psne() == Game(2, small, dense).psne(), 'psne failed'
+
+
+def test_mixed_security_levels():
+    """mixed maxmin and minmax against a separate minmax LP of every player"""
+
+    from scipy.optimize import linprog
+
+    n, s, u = util.parse('testdir/test.msne/test.0')
+    for (maxmin, sigma), (minmax, tau) in Game(n, s, u).mixed_security_levels():
+        assert abs(maxmin) < 1e-9 and abs(minmax) < 1e-9, 'rock paper scissors value failed'
+        assert np.allclose(sigma, 1/3) and np.allclose(tau, 1/3), 'rock paper scissors strategy failed'
+
+    for seed, sizes in enumerate([(3, 4), (5, 2), (2, 3, 4), (3, 3, 3)]):
+        n, s, u = benchmark.random_game(seed, sizes)
+        game = Game(n, s, u)
+        for i, ((maxmin, sigma), (minmax, tau)) in enumerate(game.mixed_security_levels(), start=1):
+            Ui = game._payoff_rows(i)
+            ns, opponents = Ui.shape
+            result = linprog([0.0] * opponents + [1.0], A_ub=np.concatenate([Ui, -np.ones((ns, 1))], axis=1),
+                             b_ub=np.zeros(ns), A_eq=[[1.0] * opponents + [0.0]], b_eq=[1.0],
+                             bounds=[(0, None)] * opponents + [(None, None)])
+
+            assert abs(maxmin - result.fun) < 1e-7 and abs(minmax - result.fun) < 1e-7, 'security level failed'
+            assert abs(sigma.sum() - 1) < 1e-9 and abs(tau.sum() - 1) < 1e-9, 'distribution failed'
+            assert tau.shape == tuple(len(Sj) for j, Sj in enumerate(s) if j != i-1), 'shape of minmax strategy failed'
+            assert game.maxmin(i)[0] <= maxmin + 1e-9, 'mixed maxmin is less than pure maxmin'
+
+
+def test_regret():
+    """batch regret against expected utilities summed over all the strategy vectors"""
+
+    rng = np.random.default_rng(0)
+    for seed, sizes in enumerate([(3, 4), (2, 3, 4), (2, 2, 2, 3)]):
+        n, s, u = benchmark.random_game(seed, sizes)
+        game = Game(n, s, u)
+        profiles = [rng.dirichlet(np.ones(size), 5) for size in sizes]
+        result = game.regret(profiles)
+
+        for b in range(5):
+            for i in range(n):
+                deviation = list()
+                for a in range(sizes[i]):
+                    value = 0.0
+                    for sv in itertools.product(*[range(size) for size in sizes]):
+                        p = np.prod([profiles[j][b, k] for j, k in enumerate(sv) if j != i])
+                        value += p * u(tuple(s[j][k] for j, k in enumerate(sv)))[i] if sv[i] == a else 0.0
+                    deviation.append(value)
+
+                assert abs(result['expected'][b, i] - np.dot(profiles[i][b], deviation)) < 1e-9, 'expected failed'
+                assert abs(result['best_response'][b, i] - max(deviation)) < 1e-9, 'best response failed'
+
+        # pure strategy nash equilibria have no regret, padded (batch x n x max #si) profiles
+        psne = game.psne() or set()
+        padded = np.zeros((len(psne), n, max(sizes)))
+        for b, sv in enumerate(psne):
+            for i, si in enumerate(sv):
+                padded[b, i, s[i].index(si)] = 1
+        assert np.all(game.regret(padded)['nash']), 'psne regret failed'
+
+
+def test_mutable_game():
+    """test incremental updates of mutable game against games solved from scratch"""
+
+    rng = np.random.default_rng(0)
+    for sizes in [(2, 2), (3, 4), (3, 3, 2), (2, 3, 2, 2)]:
+        n, s, u = benchmark.degenerate_game(int(rng.integers(1 << 30)), sizes)
+        game = MutableGame(n, s, u)
+
+        for _ in range(50):
+            profile = tuple(Si[rng.integers(len(Si))] for Si in s)
+            game.update_payoff(profile, [int(x) for x in rng.integers(0, 3, n)])
+
+            fresh = Game(n, s, game.u)
+            assert game.psne() == fresh.psne(), 'psne failed'
+            for i in range(1, n+1):
+                assert game.maxmin(i) == fresh.maxmin(i), 'maxmin failed'
+                assert game.minmax(i) == fresh.minmax(i), 'minmax failed'
+                assert game.strongly_dominant_strategy(i) == fresh.strongly_dominant_strategy(i), 'sds failed'
+                assert game.weakly_dominant_strategy(i) == fresh.weakly_dominant_strategy(i), 'wds failed'
+
+                # weak dominance, pairwise definition
+                utilities = [fresh._utility_tensor(si, i) for si in s[i-1]]
+                wds = [si for si, x in zip(s[i-1], utilities) if all(y is x or weak_dominance(x, y) for y in utilities)]
+                assert fresh.weakly_dominant_strategy(i) == (wds[0] if wds else None), 'wds failed'
+
+            # incremental state is same as state computed from scratch
+            greater, low, high = game.greater, game.low, game.high
+            game._recount()
+            for i in range(n):
+                assert np.array_equal(greater[i], game.greater[i]), 'dominance counts failed'
+                assert np.array_equal(low[i], game.low[i]) and np.array_equal(high[i], game.high[i])
+
 # vim: set path=./:
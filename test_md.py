@@ -0,0 +1,198 @@
+import itertools
+import numpy as np
+
+import util
+import main
+from mechanism_design import Environment, IncrementalChecker
+from social_function import SocialChoiceFunc, EncodedList
+
+
+def random_environment(seed, sizes=(2, 2), num_outcomes=3):
+    """random mechanism design environment with small integer utilities"""
+
+    rng = np.random.default_rng(seed)
+    n = len(sizes)
+    type_sets = [[f't{i}{k}' for k in range(size)] for i, size in enumerate(sizes)]
+    outcomes = [f'x{k}' for k in range(num_outcomes)]
+
+    mapping = dict()
+    for x in outcomes:
+        for theta in itertools.product(*type_sets):
+            mapping[','.join([x, *theta])] = [float(u) for u in rng.integers(0, 4, n)]
+
+    return Environment(n, type_sets, outcomes, lambda xtheta: mapping[xtheta.encode()])
+
+
+def symmetric_environment(seed, n=3, size=2, num_outcomes=2):
+    """random environment with interchangeable players, u_i depends on own type and others' types multiset"""
+
+    rng = np.random.default_rng(seed)
+    type_sets = [[f't{k}' for k in range(size)] for _ in range(n)]
+    outcomes = [f'x{k}' for k in range(num_outcomes)]
+    w = rng.integers(0, 3, (num_outcomes,) + (size,) * n)
+
+    mapping = dict()
+    for x, outcome in enumerate(outcomes):
+        for theta in itertools.product(range(size), repeat=n):
+            others = [tuple(sorted(theta[:i] + theta[i+1:])) for i in range(n)]
+            utility = [float(w[(x, theta[i], *others[i])]) for i in range(n)]
+            mapping[','.join([outcome, *[type_sets[i][t] for i, t in enumerate(theta)]])] = utility
+
+    return Environment(n, type_sets, outcomes, lambda xtheta: mapping[xtheta.encode()])
+
+
+def auction_environment(values=(1, 2, 3)):
+    """single item auction, outcome i gives the item to player i, type is the value of the item"""
+
+    type_sets = [[f'v{v}' for v in values] for _ in range(2)]
+    outcomes = ['1', '2']
+
+    mapping = dict()
+    for winner in range(2):
+        for v1, v2 in itertools.product(values, repeat=2):
+            utility = [float(v1) if winner == 0 else 0.0, float(v2) if winner == 1 else 0.0]
+            mapping[f'{outcomes[winner]},v{v1},v{v2}'] = utility
+
+    return Environment(2, type_sets, outcomes, lambda xtheta: mapping[xtheta.encode()])
+
+
+def brute_force(env):
+    """verdicts of all the social choice functions by id"""
+
+    verdicts = dict()
+    for func in SocialChoiceFunc.all(env.type_sets, env.outcomes):
+        verdicts[func.id] = (env.dsic(func), env.expost(func), env.dictatorial(func))
+    return verdicts
+
+
+def test_incremental_checker():
+    """id order and gray code walks report same verdicts as Environment for every function"""
+
+    n, type_sets, outcomes, u = util.parse_md('testdir/test.md/test.1')
+    environments = [Environment(n, type_sets, outcomes, u)]
+    environments += [random_environment(seed) for seed in range(3)]
+    environments += [random_environment(3, sizes=(2, 1, 2), num_outcomes=2)]
+
+    for env in environments:
+        verdicts, checker = brute_force(env), IncrementalChecker(env)
+
+        ids = list()
+        for _ in checker.lexicographic():
+            id = checker.id()
+            ids.append(id)
+            assert verdicts[id] == (checker.dsic(), checker.expost(), checker.dictatorial()), f'function #{id} failed'
+
+        assert ids == sorted(verdicts), 'functions not walked in id order'
+
+        seen = set()
+        for _ in checker.gray():
+            id = checker.id()
+            seen.add(id)
+            assert verdicts[id] == (checker.dsic(), checker.expost(), checker.dictatorial()), f'function #{id} failed'
+
+        assert seen == set(verdicts), 'gray code walk missed functions'
+
+
+def test_valid_functions():
+    """valid functions for testdir/test.md/test.1"""
+
+    n, type_sets, outcomes, u = util.parse_md('testdir/test.md/test.1')
+    checker = IncrementalChecker(Environment(n, type_sets, outcomes, u))
+
+    valid = set()
+    for _ in checker.gray():
+        if checker.dsic() and checker.expost() and not checker.dictatorial():
+            valid.add(checker.id())
+
+    assert valid == set([5, 7]), f'valid functions got {valid}, expected {{5, 7}}'
+
+
+def test_symmetry_reduction():
+    """orbits of canonical functions partition all the functions and share verdicts"""
+
+    for seed in range(3):
+        env = symmetric_environment(seed)
+        verdicts, group = brute_force(env), env.symmetries()
+        assert len(group) >= 6, f'expected all 6 player permutations, got {len(group)}'
+
+        covered, checker = list(), IncrementalChecker(env)
+        for f in group.representatives(checker):
+            assert group.canonical(f), 'non canonical representative'
+
+            verdict = (checker.dsic(), checker.expost(), checker.dictatorial())
+            for image in group.orbit(f):
+                id = env.function_id(image)
+                covered.append(id)
+                assert verdicts[id] == verdict, f'function #{id} failed'
+
+        assert sorted(covered) == sorted(verdicts), 'orbits do not partition all the functions'
+
+
+def test_vcg():
+    """clarke pivot payments of a single item auction are second price payments"""
+
+    env = auction_environment()
+    mechanism = env.vcg()
+
+    assert mechanism.f(EncodedList(['v3', 'v2'])) == '1', 'vcg outcome is not efficient'
+    assert mechanism.t(EncodedList(['v3', 'v2'])) == [-2.0, 0.0], 'clarke payments failed'
+    assert mechanism.f(EncodedList(['v1', 'v3'])) == '2', 'vcg outcome is not efficient'
+    assert mechanism.t(EncodedList(['v1', 'v3'])) == [0.0, -1.0], 'clarke payments failed'
+
+    assert env.dsic(mechanism), 'vcg mechanism is not dsic'
+
+    # first price payments, winner pays its own value, are not dsic
+    first_price = env.vcg(h=-env.U.sum(axis=2).max(axis=0)[:, None] * np.ones((1, 2)))
+    assert not env.dsic(first_price), 'first price mechanism is dsic'
+
+
+def test_parse_prior():
+    """product prior in meta.txt and joint prior in prior.csv"""
+
+    n, type_sets, outcomes, u = util.parse_md('testdir/test.md/test.2')
+    product = util.parse_prior('testdir/test.md/test.2', type_sets)
+    joint = util.parse_prior('testdir/test.md/test.3', type_sets)
+
+    expected = np.array([[0.125, 0.375], [0.125, 0.375]])
+    assert np.allclose(product, expected), f'product prior got {product}'
+    assert np.allclose(joint, expected), f'joint prior got {joint}'
+    assert util.parse_prior('testdir/test.md/test.1', [['a1'], ['a2', 'b2']]) is None, 'prior should not exist'
+
+    # models of the entry points (cli, batch, service) carry the prior
+    assert np.allclose(main.load(4, 'testdir/test.md/test.3').prior, expected), 'prior of loaded model failed'
+    assert main.load(4, 'testdir/test.md/test.1').prior is None, 'prior should not exist'
+
+
+def test_bic():
+    """interim utilities against direct expectation, dsic functions are bic"""
+
+    testcase = 'testdir/test.md/test.2'
+    n, type_sets, outcomes, u = util.parse_md(testcase)
+    env = Environment(n, type_sets, outcomes, u, prior=util.parse_prior(testcase, type_sets))
+
+    functions = list(SocialChoiceFunc.all(type_sets, outcomes))
+    batch = np.array([env.outcome_indices(func) for func in functions])
+    batch_bic = env.bic(batch)
+
+    for b, func in enumerate(functions):
+        interim = env.interim_utilities(func)
+        for i in range(n):
+            for t, true in enumerate(type_sets[i]):
+                for r, report in enumerate(type_sets[i]):
+                    expected, total = 0, 0
+                    for theta in env.thetas:
+                        if theta[i] != true:
+                            continue
+                        p = env.prior[tuple(type_sets[j].index(theta[j]) for j in range(n))]
+                        reported = EncodedList([report if j == i else theta[j] for j in range(n)])
+                        expected += p * u(EncodedList([func.f(reported), *theta]))[i]
+                        total += p
+                    assert np.isclose(interim[i][t, r], expected / total), f'interim utility of #{func.id} failed'
+
+        assert env.bic(func) == batch_bic[b], f'batch bic of #{func.id} failed'
+        if env.dsic(func):
+            assert env.bic(func), f'dsic function #{func.id} is not bic'
+
+    assert not np.all(batch_bic), 'every function is bic'
+
+# vim: set path=./:
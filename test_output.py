@@ -0,0 +1,77 @@
+import io
+import sys
+import json
+import subprocess
+import numpy as np
+
+import util
+import output
+from mechanism_design import Environment
+
+
+def test_jsonl_writer():
+    """jsonl records decode back to the functions"""
+
+    n, type_sets, outcomes, u = util.parse_md('testdir/test.md/test.1')
+    env, stream = Environment(n, type_sets, outcomes, u), io.StringIO()
+
+    writer = output.JsonlWriter(env, stream)
+    writer.write(np.array([2, 0]))
+    writer.write(np.array([1, 1]), orbit_size=1)
+    writer.close()
+
+    header, *records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert header == {'thetas': [['a1', 'a2'], ['a1', 'b2']], 'outcomes': ['x', 'y', 'z']}
+    assert records == [{'id': 7, 'f': [2, 0]}, {'id': 5, 'f': [1, 1], 'orbit_size': 1}]
+
+
+def test_binary_writer():
+    """binary records have fixed size (id, outcome indices)"""
+
+    n, type_sets, outcomes, u = util.parse_md('testdir/test.md/test.1')
+    env, stream = Environment(n, type_sets, outcomes, u), io.BytesIO()
+
+    writer = output.BinaryWriter(env, stream)
+    writer.write(np.array([2, 0]))
+    writer.close()
+
+    data = stream.getvalue()
+    magic, m, radix, id_bytes, index_bytes, flags = output.BINARY_HEADER.unpack_from(data)
+    assert (magic, m, radix, id_bytes, index_bytes, flags) == (output.BINARY_MAGIC, 2, 3, 1, 1, 0)
+    assert data[output.BINARY_HEADER.size:] == bytes([7, 2, 0])
+
+    # representatives with orbit sizes
+    stream = io.BytesIO()
+    writer = output.BinaryWriter(env, stream, orbit_sizes=True)
+    writer.write(np.array([2, 0]), orbit_size=3)
+    writer.close()
+
+    data = stream.getvalue()
+    assert output.BINARY_HEADER.unpack_from(data)[-1] == output.BINARY_ORBIT_SIZE
+    assert data[output.BINARY_HEADER.size:] == bytes([7, 2, 0]) + (3).to_bytes(8, 'little')
+
+
+def test_cli_streams():
+    """jsonl and binary records on stdout of the cli are not mixed with any other output"""
+
+    command = [sys.executable, '-W', 'ignore', 'main.py', '--q', '4', '--testcase', 'testdir/test.md/test.1']
+
+    stdout = subprocess.run(command + ['--output', 'jsonl'], capture_output=True, check=True).stdout
+    header, *records = [json.loads(line) for line in stdout.decode().splitlines()]
+    assert 'thetas' in header and len(records) > 0 and all('f' in record for record in records)
+
+    stdout = subprocess.run(command + ['--output', 'binary'], capture_output=True, check=True).stdout
+    magic, m, radix, id_bytes, index_bytes, flags = output.BINARY_HEADER.unpack_from(stdout)
+    assert magic == output.BINARY_MAGIC and flags == 0
+    assert (len(stdout) - output.BINARY_HEADER.size) % (id_bytes + m * index_bytes) == 0
+    assert len(stdout) - output.BINARY_HEADER.size == len(records) * (id_bytes + m * index_bytes)
+
+    stdout = subprocess.run(command + ['--output', 'binary', '--representatives'], capture_output=True,
+                            check=True).stdout
+    magic, m, radix, id_bytes, index_bytes, flags = output.BINARY_HEADER.unpack_from(stdout)
+    size, data = id_bytes + m * index_bytes + 8, stdout[output.BINARY_HEADER.size:]
+    assert flags == output.BINARY_ORBIT_SIZE and len(data) % size == 0
+    orbits = [int.from_bytes(data[k+size-8:k+size], 'little') for k in range(0, len(data), size)]
+    assert sum(orbits) == len(records), 'orbit sizes do not add up to number of valid functions'
+
+# vim: set path=./:
@@ -0,0 +1,34 @@
+import util
+import profiler
+from two import TwoPlayer
+
+
+def test_profiler_disabled():
+    """disabled profiler returns functions as they are and records nothing"""
+
+    profiler.disable()
+    profiler.reset()
+
+    n, s, u = util.parse('testdir/test.msne/test.1')
+    TwoPlayer(n, s, u).msne()
+
+    assert profiler.counted(u, 'utility_lookups') is u, 'disabled profiler wrapped function'
+    assert profiler.report() == {'phases': {}, 'counters': {}, 'derived': {}}, 'disabled profiler recorded'
+
+
+def test_profiler_enabled():
+    """enabled profiler counts utility lookups, supports and linprog calls"""
+
+    profiler.enable()
+    try:
+        n, s, u = util.parse('testdir/test.msne/test.1')
+        TwoPlayer(n, s, u).msne()
+        report = profiler.report()
+    finally:
+        profiler.disable()
+
+    assert report['counters']['utility_lookups'] == 9, 'utility lookups failed'
+    assert report['counters']['supports_tried'] * 2 == report['derived']['linprog_calls'], 'linprog calls failed'
+    assert report['phases']['TwoPlayer.msne']['calls'] == 1, 'msne phase failed'
+
+# vim: set path=./:
@@ -0,0 +1,61 @@
+import os
+import json
+import sys
+import time
+import socket
+import subprocess
+import concurrent.futures
+
+import service
+
+solve = 'import sys, json, main; main.solve(int(sys.argv[1]), sys.argv[2], **json.loads(sys.argv[3]))'
+
+
+def test_service(tmp_path, monkeypatch):
+    """service output matches main, parsed models are reused across concurrent requests"""
+
+    path = str(tmp_path / 'solver.sock')
+    # q1 prints sets of strategies, their order depends on the hash seed of the process
+    env = {**os.environ, 'PYTHONHASHSEED': '0'}
+    server = subprocess.Popen([sys.executable, '-W', 'ignore', 'service.py', '--socket', path],
+                              stdout=subprocess.DEVNULL, env=env)
+    try:
+        for _ in range(200):
+            if os.path.exists(path):
+                break
+            time.sleep(0.05)
+
+        jobs = [(1, 'testdir/test.game/test.1', {}), (4, 'testdir/test.md/test.1', {'mode': 'count'})] * 4
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(lambda job: service.request(path, *job, timeout=30), jobs))
+
+        for (question, testcase, options), response in zip(jobs, responses):
+            assert response['status'] == 'ok', response.get('error')
+            expected = subprocess.run([sys.executable, '-W', 'ignore', '-c', solve, str(question), testcase,
+                                       json.dumps(options)], env=env, capture_output=True, text=True).stdout
+            assert response['output'] == expected, f'q{question} output failed'
+
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(path)
+            client.sendall(b'{"op": "stats"}\n')
+            stats = json.loads(client.makefile('rb').readline())
+        assert stats['models'] == 2 and stats['hits'] + stats['misses'] == len(jobs), stats
+
+        # relative out is written to the working directory of the client
+        testcase = os.path.abspath('testdir/test.md/test.1')
+        (tmp_path / 'client').mkdir()
+        monkeypatch.chdir(tmp_path / 'client')
+        response = service.request(path, 4, testcase, {'mode': 'jsonl', 'out': 'valid.jsonl'}, timeout=30)
+        assert response['status'] == 'ok', response.get('error')
+        with open(tmp_path / 'client' / 'valid.jsonl') as file:
+            assert [json.loads(line)['id'] for line in file.readlines()[1:]] == [5, 7], 'out file failed'
+
+        error = service.request(path, 1, str(tmp_path / 'missing'), timeout=30)
+        assert error['status'] == 'error' and 'FileNotFoundError' in error['error']
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    assert not os.path.exists(path), 'socket was not removed'
+
+# vim: set path=./:
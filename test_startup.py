@@ -0,0 +1,46 @@
+import os
+import sys
+import subprocess
+
+# budget of cold start imports of a q1 run in seconds, override with GT_IMPORT_BUDGET for slow machines
+IMPORT_BUDGET = float(os.environ.get('GT_IMPORT_BUDGET', 0.3))
+
+q1 = """
+import io, sys, main
+main.solve(1, 'testdir/test.game/test.1', file=io.StringIO())
+print(','.join(sorted(sys.modules)))
+"""
+
+
+def cold_start():
+    """import time (-X importtime) of all the top level imports and loaded modules of a q1 run"""
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', q1],
+                            capture_output=True, text=True, check=True)
+
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, package = line.split('|')
+        if not package.startswith('  '):  # top level import
+            total += int(cumulative)
+
+    return total / 1e6, set(result.stdout.strip().split(','))
+
+
+def test_lazy_imports():
+    """q1 does not import solver stacks of other questions"""
+
+    _, modules = cold_start()
+    for module in ('scipy', 'two', 'mechanism_design', 'output', 'cache', 'batch', 'service', 'asyncio'):
+        assert module not in modules, f'{module} is imported by q1'
+
+
+def test_import_budget():
+    """cold start of q1 fits in import budget, best of 3 runs"""
+
+    elapsed = min(cold_start()[0] for _ in range(3))
+    assert elapsed < IMPORT_BUDGET, f'q1 imports took {elapsed:.3f}s, budget {IMPORT_BUDGET:.3f}s'
+
+# vim: set path=./:
@@ -25,6 +25,9 @@ def test_non_zero_sum():
     condition = condition and equal(result_2[2], 0)
     assert condition, 'Non zero sum game MSNE failed'
 
+    regret = game.regret([result_1[None], result_2[None]])
+    assert regret['nash'][0] and equal(regret['expected'][0, 0], 3.75), 'MSNE regret failed'
+
 def test_zero_sum():
     testcase = 'testdir/test.msne/test.0'
     n, s, u = util.parse(testcase)
@@ -42,3 +45,41 @@ def test_zero_sum():
     condition = equal(result_1[0], result_1[1]) and equal(result_1[1], result_1[2])
     condition = condition and equal(result_2[0], result_2[1]) and equal(result_2[1], result_2[2])
     assert condition, 'Non zero sum game MSNE failed'
+
+def test_saddle_point():
+    """saddle points are (maxmin strategy of player 1, maxmin strategy of player 2) if values match"""
+
+    A = [[3, 1, 4], [2, 0, 1], [5, 1, 6]]
+    s = [['a', 'b', 'c'], ['p', 'q', 'r']]
+    mapping = {f'{s1},{s2}': [A[i][j], -A[i][j]] for i, s1 in enumerate(s[0]) for j, s2 in enumerate(s[1])}
+    game = TwoPlayerZeroSum(2, s, util.make_utility(2, mapping))
+    assert game.saddle_point() == {('a', 'q'), ('c', 'q')}, 'saddle point failed'
+
+    n, s, u = util.parse('testdir/test.msne/test.0')
+    assert TwoPlayerZeroSum(n, s, u).saddle_point() is None, 'saddle point of rock paper scissors failed'
+
+def test_replicator():
+    """replicator dynamics converge to stable pure equilibria, cycle around msne of rock paper scissors"""
+
+    s = [['a', 'b'], ['p', 'q']]
+    A = [[2, 0], [0, 1]]
+    mapping = {f'{s1},{s2}': [A[i][j], A[i][j]] for i, s1 in enumerate(s[0]) for j, s2 in enumerate(s[1])}
+    game = TwoPlayer(2, s, util.make_utility(2, mapping))
+
+    for mode in ('discrete', 'continuous'):
+        result = game.replicator(500, 20000, mode=mode, dt=0.05)
+        assert np.all(result['converged']), f'{mode} replicator did not converge'
+
+        # equilibria are psne (a, p), (b, q) and the unstable msne (1/3, 2/3)
+        assert len(result['equilibria']) == 3, 'equilibria failed'
+        labels = np.bincount(result['label'] + 1, minlength=4)
+        assert labels[0] == 0 and labels[3] == 0 and labels[1] > 0 and labels[2] > 0, f'{mode} labels failed'
+
+        # starts in the basin of (a, p)
+        x0, y0 = np.array([[0.9, 0.1], [0.6, 0.4]]), np.array([[0.8, 0.2], [0.7, 0.3]])
+        assert np.all(game.replicator((x0, y0), 20000, mode=mode, dt=0.05)['label'] == 0), f'{mode} basin failed'
+
+    n, s, u = util.parse('testdir/test.msne/test.0')
+    result = TwoPlayer(n, s, u).replicator(100, 5000, mode='continuous', dt=0.01)
+    assert not np.any(result['converged']), 'rock paper scissors converged'
+    assert np.all(np.abs(result['mean_x'] - 1/3) < 0.1), 'time average of rock paper scissors failed'
@@ -1,4 +1,6 @@
-from util import parse
+import numpy as np
+
+from util import parse, sparse_store
 
 
 def test_parse():
@@ -18,4 +20,21 @@ def test_parse():
     for sv, res in zip(strategy_vectors, results):
         assert u(sv) == res, f'{testcase} [utility_function] failed'
 
+
+def test_parse_sparse():
+    """strategy vectors missing in utility.csv have default utility"""
+
+    testcase = 'testdir/test.game/test.4'
+    n, s, u = parse(testcase)
+
+    assert u(['a', 'p']) == [2, 1] and u(['b', 'p']) == [0, 0], f'{testcase} [utility_function] failed'
+    assert u(['a', 'z']) is None, f'{testcase} [utility_function] failed for unknown strategy'
+
+    store = sparse_store(u)
+    assert store.missing == 6, f'{testcase} [missing] got {store.missing} expected 6'
+
+    indices = np.array([[0, 0], [1, 1], [2, 2], [2, 0]])
+    expected = np.array([[2, 1], [-1, 3], [1, 1], [0, 0]])
+    assert np.array_equal(store.lookup(indices), expected), f'{testcase} [lookup] failed'
+
 # vim: set path=./:
@@ -4,6 +4,7 @@ import numpy as np
 from scipy.optimize import linprog
 from game import Game
 import util
+import profiler
 
 zero_p = 0.0000000000000001
 one_m = 1
@@ -47,6 +48,12 @@ class TwoPlayer(Game):
         game = self._iterative_elimination()
         return TwoPlayer(game.n, game.s, game.u)
 
+    def _payoff_tensor(self):
+        """utility tensor (#s1 x #s2 x 2) from utility matrices"""
+
+        return np.stack(self.U, axis=-1)
+
+    @profiler.profiled('TwoPlayer.msne')
     def msne(self):
         """find Mix Strategy Nash Equilibrium for 2 player game"""
 
@@ -54,6 +61,8 @@ class TwoPlayer(Game):
         for support1 in util.power_supports(self.s[0]):
             for support2 in util.power_supports(self.s[1]):
                 # logging.info(f'MSNE calculation for supports: {support1}\n{support2}')
+                if profiler.enabled:
+                    profiler.count('supports_tried')
                 result2 = self._lp_msne(support1, support2, 1)
                 result1 = self._lp_msne(support2, support1, 2)
                 if result1.success and result2.success:
@@ -61,6 +70,112 @@ class TwoPlayer(Game):
 
         logging.warning('not able to find msne for the game')
 
+    @profiler.profiled('TwoPlayer.replicator')
+    def replicator(self, starts=1000, steps=10000, mode='discrete', dt=0.01, tol=1e-9, equilibria=None,
+                   radius=1e-3, seed=0):
+        """
+        replicator simulates two population replicator dynamics from a batch of initial states at once,
+        fitness of all the states is a batched matrix product, f1 = y U1^T and f2 = x U2
+            discrete: x'(a) = x(a) f1(a) / Σ_b x(b) f1(b) with utilities shifted to be positive
+            continuous: dx(a)/dt = x(a) (f1(a) - Σ_b x(b) f1(b)), euler steps of length dt
+        and same for y with f2, a converged trajectory is not advanced further, only streaming
+        summaries (time averages, steps) are kept, so memory does not grow with number of steps
+
+        starts: number of random initial states (uniform on the simplices) or (x0, y0) arrays (B x #s1), (B x #s2)
+        steps: maximum number of steps of a trajectory
+        mode: discrete or continuous
+        dt: step length of continuous dynamics
+        tol: trajectory converges when change of the state (per unit time for continuous) is less than tol
+        equilibria: list of (x, y) to classify limit points, default all psne and msne of the game
+        radius: limit point is classified as an equilibrium within radius (max norm)
+        seed: seed of random initial states
+        return: dictionary of
+            x, y: final states, (B x #s1) and (B x #s2)
+            mean_x, mean_y: time averages of states over trajectories
+            converged: (B) array, whether trajectory converged
+            steps: (B) array, number of steps until convergence (steps if not converged)
+            label: (B) array, index of equilibrium of the limit point, -1 if not converged or not an equilibrium
+            equilibria: equilibria used for labels
+        """
+
+        assert mode in ('discrete', 'continuous'), f'unknown replicator dynamics {mode}'
+
+        if isinstance(starts, int):
+            rng = np.random.default_rng(seed)
+            x0, y0 = rng.dirichlet(np.ones(len(self.s[0])), starts), rng.dirichlet(np.ones(len(self.s[1])), starts)
+        else:
+            x0, y0 = starts
+        x, y = np.array(x0, dtype=float), np.array(y0, dtype=float)
+        batch = x.shape[0]
+
+        U1, U2 = self.U[0].astype(float), self.U[1].astype(float)
+        if mode == 'discrete':
+            U1, U2 = U1 - U1.min() + 1, U2 - U2.min() + 1
+
+        # summaries of all the trajectories, states of active trajectories are kept compact
+        sum_x, sum_y = x.copy(), y.copy()
+        converged, taken = np.zeros(batch, dtype=bool), np.full(batch, steps)
+        final_x, final_y = x.copy(), y.copy()
+        active = np.arange(batch)
+
+        for step in range(1, steps+1):
+            f1, f2 = y @ U1.T, x @ U2
+            if mode == 'discrete':
+                new_x, new_y = x * f1, y * f2
+                new_x /= new_x.sum(axis=1, keepdims=True)
+                new_y /= new_y.sum(axis=1, keepdims=True)
+                speed = np.maximum(np.abs(new_x - x).max(axis=1), np.abs(new_y - y).max(axis=1))
+            else:
+                dx = x * (f1 - (x * f1).sum(axis=1, keepdims=True))
+                dy = y * (f2 - (y * f2).sum(axis=1, keepdims=True))
+                new_x, new_y = np.clip(x + dt * dx, 0, None), np.clip(y + dt * dy, 0, None)
+                new_x /= new_x.sum(axis=1, keepdims=True)
+                new_y /= new_y.sum(axis=1, keepdims=True)
+                speed = np.maximum(np.abs(dx).max(axis=1), np.abs(dy).max(axis=1))
+
+            x, y = new_x, new_y
+            sum_x[active] += x
+            sum_y[active] += y
+
+            done = speed < tol
+            if np.any(done):
+                finished = active[done]
+                converged[finished], taken[finished] = True, step
+                final_x[finished], final_y[finished] = x[done], y[done]
+                active, x, y = active[~done], x[~done], y[~done]
+                if len(active) == 0:
+                    break
+
+        final_x[active], final_y[active] = x, y
+        mean_x, mean_y = sum_x / (taken[:, None] + 1), sum_y / (taken[:, None] + 1)
+
+        if equilibria is None:
+            equilibria = self._equilibria()
+        label = np.full(batch, -1)
+        if len(equilibria) > 0:
+            distance = np.stack([np.maximum(np.abs(final_x - ex).max(axis=1), np.abs(final_y - ey).max(axis=1))
+                                 for ex, ey in equilibria], axis=1)
+            nearest = distance.argmin(axis=1)
+            within = converged & (distance[np.arange(batch), nearest] <= radius)
+            label[within] = nearest[within]
+
+        return {'x': final_x, 'y': final_y, 'mean_x': mean_x, 'mean_y': mean_y, 'converged': converged,
+                'steps': taken, 'label': label, 'equilibria': equilibria}
+
+    def _equilibria(self):
+        """psne (as mixed strategies) and msne of the game"""
+
+        equilibria = list()
+        for s1, s2 in sorted(self.psne() or set()):
+            x, y = np.zeros(len(self.s[0])), np.zeros(len(self.s[1]))
+            x[self.s[0].index(s1)], y[self.s[1].index(s2)] = 1.0, 1.0
+            equilibria.append((x, y))
+
+        msne = self.msne()
+        if msne is not None and not any(np.allclose(msne[0], x) and np.allclose(msne[1], y) for x, y in equilibria):
+            equilibria.append(msne)
+        return equilibria
+
     def _lp_msne(self, self_support, opponent_support, player=1):
         """Find msne for self_support and opponent_support for player 1 and 2"""
 
@@ -93,7 +208,8 @@ class TwoPlayer(Game):
         p_bounds = np.array([(zero_p, one_m) for _ in range(ns)])
         p_bounds[np.where(opponent_support == 0)] = (0, 0)
 
-        return linprog(f, A_ub=Aub, b_ub=Bub, A_eq=Aeq, b_eq=Beq, bounds=[(None, None), *p_bounds], method='simplex')
+        return profiler.call('linprog', linprog, f, A_ub=Aub, b_ub=Bub, A_eq=Aeq, b_eq=Beq,
+                             bounds=[(None, None), *p_bounds], method='simplex')
 
 
 class TwoPlayerZeroSum(TwoPlayer):
@@ -117,24 +233,28 @@ class TwoPlayerZeroSum(TwoPlayer):
         # check if utilities are according to zero sum game
         assert np.all(self.U[0] == -self.U[1]), 'provided game is not a zero sum game'
 
+    @profiler.profiled('TwoPlayerZeroSum.saddle_point')
     def saddle_point(self):
         """
-        Find saddle point of two player zero sum game if exist
+        Find saddle point of two player zero sum game if exist, saddle point exists iff
+        maxmin value of player 1 (max_s1 min_s2 u1) is equal to minmax value of player 1
+        (min_s2 max_s1 u1 = -maxmin value of player 2)
 
-        return: saddle point if exist else None
+        return: set of saddle points (s1, s2) if exist else None
         """
 
-        maxmin_value, maxmin_strategy_set = self.maxmin(0)
-        minmax_value, minmax_strategy_set = self.minmax(1)
+        maxmin_value1, maxmin_strategy_set1 = self.maxmin(1)
+        maxmin_value2, maxmin_strategy_set2 = self.maxmin(2)
 
-        if maxmin_value == minmax_value:
-            return maxmin_strategy_set.intersection(minmax_strategy_set)
+        if maxmin_value1 == -maxmin_value2:
+            return set(itertools.product(maxmin_strategy_set1, maxmin_strategy_set2))
         return None
 
     def iterative_elimination(self):
         game = self._iterative_elimination()
         return TwoPlayerZeroSum(game.n, game.s, game.u)
 
+    @profiler.profiled('TwoPlayerZeroSum.msne')
     def msne(self):
         """
         msne calculates Mixed Strategy Nash equilibrium for a (n x m)
@@ -169,6 +289,7 @@ class TwoPlayerZeroSum(TwoPlayer):
         r_bounds = (None, None)
         p_bounds = [(0, 1.0) for _ in S]
 
-        return linprog(f, A_ub=a_ub, b_ub=b_ub, A_eq=a_eq, b_eq=b_eq, bounds=[r_bounds, *p_bounds])
+        return profiler.call('linprog', linprog, f, A_ub=a_ub, b_ub=b_ub, A_eq=a_eq, b_eq=b_eq,
+                             bounds=[r_bounds, *p_bounds])
 
 # vim: set path=./:
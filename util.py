@@ -1,7 +1,10 @@
+import os
+import math
 import logging
 import itertools
 import inspect
 import numpy as np
+import profiler
 from social_function import EncodedList
 
 def parse(testcase):
@@ -13,14 +16,15 @@ def parse(testcase):
     return: (number_of_players, strategy_profiles, utility_function)
     """
 
-    number_of_players, strategy_profiles = None, list()
+    number_of_players, strategy_profiles, default = None, list(), None
     with open(f'{testcase}/meta.txt', 'r') as metafile:
         # all the lines starting with # are comments
         # first uncommented line contains number of players
         # next n uncommented lines contain strategy profiles
-        while True:
-            line = metafile.readline()
-            if len(line) != 0 and line[0] == '#':
+        # optional next uncommented line contains default utilities of all the players,
+        # for the strategy vectors which are not in utility.csv (sparse games)
+        for line in metafile.readlines():
+            if len(line.strip()) == 0 or line[0] == '#':
                 # its a comment ignore
                 continue
 
@@ -29,12 +33,12 @@ def parse(testcase):
                 continue
 
             if len(strategy_profiles) < number_of_players:
-                strategies = (line[:-1]).replace(' ', '').split(',')
-                if len(strategies) != 0:
-                    strategy_profiles.append(strategies)
+                strategy_profiles.append(line.replace(' ', '').strip().split(','))
                 continue
 
-            break
+            if default is None:
+                default = [float(u) for u in line.replace(' ', '').strip().split(',')]
+                assert len(default) == number_of_players, f'default utility should have {number_of_players} values'
 
     utility_sv_mapping = dict()
     with open(f'{testcase}/utility.csv', 'r') as utilityfile:
@@ -52,6 +56,142 @@ def parse(testcase):
             sv_encoding = ','.join(sv)
             utility_sv_mapping[sv_encoding] = [float(u) for u in uv]
 
+    u = SparseUtility(strategy_profiles, utility_sv_mapping, default)
+    if u.missing > 0:
+        if default is None:
+            logging.warning(f'{testcase}: {u.missing} strategy vectors have no utility and no default utility')
+        else:
+            logging.info(f'{testcase}: {u.missing} strategy vectors have default utility {default}')
+
+    return number_of_players, strategy_profiles, profiler.counted(u, 'utility_lookups')
+
+class SparseUtility:
+    """
+    SparseUtility is a utility function stored only for the given strategy vectors, all the
+    other strategy vectors have default utility, a strategy vector is keyed by its mixed radix
+    code over strategy indices, code(k1, ..., kn) = Σ ki * radix_i, radix_n = 1
+
+    Attributes:
+        n: number of players
+        index: index[i][si] = index of strategy si of (i+1)th player
+        sizes: number of strategies of every player
+        radix: radix of every player
+        default: default utilities of all the players, None if not declared
+        rows: rows[code] = utilities of all the players
+        codes, indices, values: sorted codes, strategy indices (k x n) and utilities (k x n) of stored strategy vectors
+        missing: number of strategy vectors which have default utility
+    """
+
+    def __init__(self, strategy_profiles, utility_sv_mapping, default=None):
+        self.n = len(strategy_profiles)
+        self.index = [{si: k for k, si in enumerate(Si)} for Si in strategy_profiles]
+        self.sizes = [len(Si) for Si in strategy_profiles]
+        self.radix = [math.prod(self.sizes[i+1:]) for i in range(self.n)]
+        self.default = default
+
+        self.rows = dict()
+        for sv_encoding, utilities in utility_sv_mapping.items():
+            sv = sv_encoding.split(',')
+            try:
+                self.rows[self.code(sv)] = utilities
+            except KeyError:
+                logging.warning(f'KeyError: unexpected strategy vector in utility.csv, {sv}')
+
+        self.missing = math.prod(self.sizes) - len(self.rows)
+
+        # vectorized lookups need codes in int64, otherwise codes are python integers
+        dtype = np.int64 if math.prod(self.sizes) < 2**63 else object
+        codes = sorted(self.rows)
+        self.codes = np.array(codes, dtype=dtype)
+        self.values = np.array([self.rows[code] for code in codes], dtype=float).reshape(len(codes), self.n)
+        self.indices = np.array([[(code // r) % size for r, size in zip(self.radix, self.sizes)] for code in codes],
+                                dtype=np.int64).reshape(len(codes), self.n)
+
+    def code(self, sv):
+        """mixed radix code of strategy vector, KeyError for unknown strategies"""
+
+        return sum(self.index[i][si] * self.radix[i] for i, si in enumerate(sv))
+
+    def __call__(self, sv):
+        """
+        utility lookup for strategy vector is O(n)
+
+        sv: strategy vector
+        return: utilities of all the players, e.g. list of utilities
+        """
+
+        assert len(sv) == self.n, f'strategy vector should have length equal to {self.n}'
+
+        try:
+            code = self.code(sv)
+        except KeyError:
+            logging.warning(f'KeyError: unexpected strategy vector, {sv}')
+            return None
+
+        # missing strategy vectors are reported by parse
+        return self.rows.get(code, self.default)
+
+    def code_of(self, k):
+        """mixed radix code of strategy indices k, python integer"""
+
+        return sum(int(ki) * r for ki, r in zip(k, self.radix))
+
+    def lookup(self, indices):
+        """
+        lookup utilities of a batch of strategy vectors, codes are searched in sorted codes
+
+        indices: (... x n) array of strategy indices
+        return: (... x n) array of utilities, nan for missing strategy vectors if default is not declared
+        """
+
+        indices = np.asarray(indices, dtype=np.int64)
+        profiler.count('utility_lookups', indices.size // self.n)
+
+        default = np.array(self.default if self.default is not None else [np.nan] * self.n, dtype=float)
+        if self.codes.dtype == object:
+            values = [self.rows.get(self.code_of(k), default) for k in indices.reshape(-1, self.n)]
+            return np.array(values, dtype=float).reshape(indices.shape)
+        if len(self.codes) == 0:
+            return np.broadcast_to(default, indices.shape).copy()
+
+        codes = indices @ np.array(self.radix, dtype=np.int64)
+        position = np.minimum(np.searchsorted(self.codes, codes), len(self.codes) - 1)
+        found = self.codes[position] == codes
+        return np.where(found[..., None], self.values[position], default)
+
+    def restrict(self, indices):
+        """
+        restrict stored strategy vectors to a subgame
+
+        indices: indices[i] = array of strategy indices of (i+1)th player in subgame
+        return: positions (k x n) in subgame and utilities (k x n) of the stored strategy vectors of subgame
+        """
+
+        keep = np.ones(len(self.codes), bool)
+        positions = np.empty(self.indices.shape, dtype=np.int64)
+        for i, k in enumerate(indices):
+            where = np.full(self.sizes[i], -1)
+            where[k] = np.arange(len(k))
+            positions[:, i] = where[self.indices[:, i]]
+            keep &= positions[:, i] >= 0
+
+        return positions[keep], self.values[keep]
+
+def sparse_store(u):
+    """sparse_store reports SparseUtility of utility function u (possibly wrapped by profiler), None otherwise"""
+
+    u = getattr(u, '__wrapped__', u)
+    return u if isinstance(u, SparseUtility) else None
+
+def make_utility(number_of_players, utility_sv_mapping):
+    """
+    make_utility creates utility function of a game from mapping of strategy vectors to utilities
+
+    number_of_players: number of players
+    utility_sv_mapping: mapping of encoded strategy vector, e.g. 'a,p', to utilities of all the players
+    return: utility_function
+    """
+
     def utility_function(sv):
         """
         utility lookup for strategy vector is O(1)
@@ -70,7 +210,7 @@ def parse(testcase):
 
         return None
 
-    return number_of_players, strategy_profiles, utility_function
+    return profiler.counted(utility_function, 'utility_lookups')
 
 def parse_md(testcase):
     """
@@ -132,7 +272,60 @@ def parse_md(testcase):
         except KeyError:
             logging.error(f'Invalid Ѳ, no mapping available for {theta}')
 
-    return number_of_players, type_sets, outcomes, utility_func
+    return number_of_players, type_sets, outcomes, profiler.counted(utility_func, 'utility_lookups')
+
+def parse_prior(testcase, type_sets):
+    """
+    parse_prior parse optional prior over types for mechanism design environment
+    product prior: after the outcome set meta.txt contains one line for each player
+                   with probabilities of its types (in the order of its type set)
+    joint prior: prior.csv file, first line contains indexes, next lines contain Ѳ, p
+
+    testcase: path to testcase folder for Q4
+    type_sets: type set of each player
+    return: prior (#t1 x #t2 x ... x #tn array, normalized) or None if not given
+    """
+
+    n, sizes = len(type_sets), [len(t) for t in type_sets]
+
+    marginals = list()
+    with open(f'{testcase}/meta.txt') as metafile:
+        # skip number of players, type sets and outcome set
+        uncommented = 0
+        for line in metafile.readlines():
+            if line[0] == '#' or len(line.strip()) == 0:
+                continue
+
+            uncommented += 1
+            if uncommented > n + 2 and len(marginals) < n:
+                marginals.append([float(p) for p in line.replace(' ', '').strip().split(',')])
+
+    if len(marginals) == n:
+        prior = np.ones(sizes)
+        for i, marginal in enumerate(marginals):
+            assert len(marginal) == sizes[i], f'prior of player {i+1} should have {sizes[i]} probabilities'
+            shape = [1 for _ in range(n)]
+            shape[i] = sizes[i]
+            prior = prior * np.array(marginal).reshape(shape)
+        return prior / prior.sum()
+
+    if not os.path.exists(f'{testcase}/prior.csv'):
+        return None
+
+    prior = np.zeros(sizes)
+    with open(f'{testcase}/prior.csv') as priorfile:
+        # first line contains the indexes of the csv file ignore it
+        _ = priorfile.readline()
+
+        for line in priorfile.readlines():
+            theta_p = (line[:-1]).replace(' ', '').split(',')
+            theta, p = theta_p[:n], float(theta_p[n])
+            try:
+                prior[tuple(type_sets[i].index(theta[i]) for i in range(n))] = p
+            except ValueError:
+                logging.error(f'Invalid Ѳ in prior, {theta}')
+
+    return prior / prior.sum()
 
 def power_supports(strategy_profile):
     """